@@ -1,11 +1,42 @@
 import os
 import subprocess
+import sys
+import importlib.util
 from dotenv import load_dotenv
 
 load_dotenv()
 VERSION = os.getenv('VERSION')
+DAEMON = os.getenv('DAEMON')  # 'True' to load the pipeline once and run it on SCHEDULE in this process
+SCHEDULE = os.getenv('SCHEDULE', '0 * * * *')  # cron expression, hourly by default
+METRICS_PORT = os.getenv('METRICS_PORT')  # serve Prometheus metrics on this port in daemon mode
 
 script_to_run = f'v{VERSION}/main.py'
 
-# Run the selected script
-subprocess.run(['python', script_to_run])
\ No newline at end of file
+
+def load_pipeline(path):
+    # import the versioned script as a module so its clients, caches and agents stay loaded between runs
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    spec = importlib.util.spec_from_file_location('pipeline', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+if DAEMON == 'True':
+    if VERSION != '2':
+        raise Exception("Daemon mode requires VERSION=2")
+    from scheduler import run_forever
+
+    pipeline = load_pipeline(script_to_run)
+    pipeline.parse_pool.start()  # fork the parse processes before any other thread runs
+    if METRICS_PORT:
+        pipeline.metrics.serve(int(METRICS_PORT))
+    try:
+        run_forever(pipeline.run, SCHEDULE)
+    finally:
+        pipeline.llm_cache.close()
+        pipeline.article_cache.close()
+        pipeline.parse_pool.close()
+else:
+    # Run the selected script
+    subprocess.run(['python', script_to_run])
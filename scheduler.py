@@ -0,0 +1,87 @@
+"""Cron-style scheduling for the long-running daemon mode."""
+import time
+from datetime import datetime, timedelta
+
+# (name, min, max) of the five cron fields
+_FIELDS = [('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 6)]
+
+
+def _parse_field(field: str, low: int, high: int) -> set:
+    values = set()
+    for part in field.split(','):
+        part, _, step = part.partition('/')
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = map(int, part.split('-'))
+        else:
+            start = int(part)
+            end = high if step else start
+        if not low <= start <= end <= high:
+            raise ValueError(f"Invalid cron field: {field}")
+        values.update(range(start, end + 1, int(step) if step else 1))
+    return values
+
+
+class CronSchedule:
+    """A five-field cron expression: minute hour day-of-month month day-of-week (0 = Sunday).
+
+    As in cron, when both day fields are restricted a day matches either of
+    them: `0 0 1 * 1` fires on the 1st of the month and on every Monday.
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            _parse_field(field, low, high) for field, (_, low, high) in zip(fields, _FIELDS)
+        )
+        # a day field starting with * (also */2) doesn't restrict the day
+        self.days_or_weekdays = not fields[2].startswith('*') and not fields[4].startswith('*')
+
+    def _day_matches(self, moment: datetime) -> bool:
+        in_days = moment.day in self.days
+        in_weekdays = (moment.weekday() + 1) % 7 in self.weekdays
+        return in_days or in_weekdays if self.days_or_weekdays else in_days and in_weekdays
+
+    def matches(self, moment: datetime) -> bool:
+        return (moment.minute in self.minutes and moment.hour in self.hours and moment.month in self.months
+                and self._day_matches(moment))
+
+    def next_after(self, moment: datetime) -> datetime:
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Feb 29 can be 8 years away (2096 to 2104), any other valid schedule fires within a year
+        limit = moment + timedelta(days=8 * 366)
+        while moment < limit:
+            if moment.month not in self.months or not self._day_matches(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression never fires: {self.expression}")
+
+
+def run_forever(job, expression: str, run_on_start: bool = True):
+    """Call `job` on the cron schedule until interrupted; a failed run does not stop the loop."""
+    schedule = CronSchedule(expression)
+    if run_on_start:
+        _run_once(job)
+    while True:
+        next_run = schedule.next_after(datetime.now())
+        print(f"Next run at {next_run}")
+        time.sleep(max(0, (next_run - datetime.now()).total_seconds()))
+        _run_once(job)
+
+
+def _run_once(job):
+    start = time.monotonic()
+    try:
+        job()
+    except Exception as e:
+        print(f"Run failed: {str(e)}")
+    print(f"Run finished in {time.monotonic() - start:.1f}s")
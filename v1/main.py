@@ -1,7 +1,7 @@
 from dotenv import load_dotenv
 from autogen import UserProxyAgent, AssistantAgent
-from twikit import Client
 import os
+import sys
 
 keyword = "Artificial Intelligence"
 article_count = 10
@@ -15,6 +15,7 @@ GROQ_MODEL_NAME = os.getenv("GROQ_MODEL_NAME")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_API_BASE = os.getenv("GROQ_API_BASE")
 RELEASE = os.getenv("RELEASE")
+LEDGER_TTL_DAYS = float(os.getenv("LEDGER_TTL_DAYS", 30))  # forget processed urls after this many days, as v2 does
 
 if(RELEASE == "PROD"):
     USERNAME = os.getenv("XUSERNAME")
@@ -27,7 +28,7 @@ else:
 
 # Config dictionary
 llm_config = {
-    "cache_seed": 42,
+    "cache_seed": None,
     "config_list": [{
         "model": GROQ_MODEL_NAME,
         "api_key": GROQ_API_KEY,
@@ -35,40 +36,42 @@ llm_config = {
     }],
 }
 
-# # Initialize client
-if 'x_client' not in globals():
-    x_client = Client('en-US')
+# the url ledger, caches and X session are shared with v2
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'v2'))
+from session import XSession
 
-    x_client.login(
-        auth_info_1=USERNAME,
-        auth_info_2=EMAIL,
-        password=PASSWORD
-    )
-    print("Client initialized")
+# # Initialize client
+# the saved session is restored, or the login run, on the first tweet, so DEV runs never touch X
+x_session = XSession(f'.cache/x_session_{USERNAME}.json', USERNAME, EMAIL, PASSWORD)
 
 
 import random
 from newspaper import Article
 import pandas as pd
-import os
+
+from ledger import UrlLedger
+from canonical import canonicalize_url
+from shortener import ShortUrlService
+from llm_cache import LLMCache
 
 urls_file = '.cache/urls.csv'
+url_ledger = UrlLedger(urls_file, ttl_days=LEDGER_TTL_DAYS)
+# v2 keys the shared ledger by canonical url, so v1 looks up and records the same keys
+url_ledger.rekey(canonicalize_url)
+short_url_service = ShortUrlService('.cache/short_urls.json')
+llm_cache = LLMCache('.cache/llm_cache.db')
 
 def select_random_article(news_list):
-    if not os.path.isfile(urls_file):
-        df_urls = pd.DataFrame(columns=['urls', 'status'])  # Define the variable with a default value
-        df_urls.to_csv(urls_file)
-    else:
-        df_urls = pd.read_csv(urls_file, index_col='Unnamed: 0')
     news, article = None, None
     
     while True:
         print(f'NEWS LIST: {news_list}')
-        #remove any news from the news_list if it is already in the csv file
-        news_list = [news for news in news_list if news['url'] not in df_urls['urls'].values]
+        #remove any news from the news_list if it is already in the ledger
+        news_list = [news for news in news_list if canonicalize_url(news['url']) not in url_ledger]
         print(f'FILTERED NEWS LIST: {news_list}')
         if not news_list:
             print("No more news to select")
+            url_ledger.flush()
             return None, None
         
         news = random.choice(news_list)
@@ -82,26 +85,26 @@ def select_random_article(news_list):
             article.parse()
 
             if article.text and len(article.text.strip().split('\n')) > 1:
-                # Append the URL and status to the DataFrame
-                df_urls = pd.concat([pd.DataFrame([[news['url'], 'success']], columns=df_urls.columns), df_urls], ignore_index=True)
-                df_urls.to_csv(urls_file)
+                # Record the URL and status in the ledger
+                url_ledger.record(canonicalize_url(news['url']), 'success')
                 break
             else:
-                df_urls = pd.concat([pd.DataFrame([[news['url'], 'empty']], columns=df_urls.columns), df_urls], ignore_index=True)
-                df_urls.to_csv(urls_file)
+                url_ledger.record(canonicalize_url(news['url']), 'empty')
                 continue
         except Exception as e:
-            # Append the URL and status to the DataFrame
-            df_urls = pd.concat([pd.DataFrame([[news['url'], 'error']], columns=df_urls.columns), df_urls], ignore_index=True)
-            df_urls.to_csv(urls_file)
+            # Record the URL and status in the ledger
+            url_ledger.record(canonicalize_url(news['url']), 'error')
             print(f"Error selecting article: {str(e)}")
             continue
+    url_ledger.flush()
     return news, article
 
 
 from typing import Annotated
 from gnews import GNews
-from pyshorteners import Shortener
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+import time
 
 topics_file = '.cache/topics.csv'
 
@@ -109,12 +112,57 @@ topics_file = '.cache/topics.csv'
 if os.path.isfile(topics_file):
     os.remove(topics_file)
 
+# every topic's feed is fetched once over the widest period, the narrower periods are filtered locally
+feed_executor = ThreadPoolExecutor(max_workers=2)
+feed_futures = {}  # topic -> Future of [(published ts or None, news), ...]
+feed_requests = 0
+prefetched_topic = None  # the pending topic whose feed is fetched ahead of a topic switch
+
+def published_ts(news):
+    try:
+        return parsedate_to_datetime(news['published date']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def fetch_feed(topic, count):
+    global feed_requests
+    google_news = GNews()
+    # as many items as the 1h, 2h and 3h queries returned together; GNews sends a HEAD request for each item
+    google_news.max_results = count * max_period_hours
+    google_news.language = 'english'  # News in a specific language
+    google_news.country = news_country  # News from a specific country
+    google_news.period = f'{max_period_hours}h'
+    feed_requests += 1
+    print(f"FETCHING NEWS ON TOPIC: {topic}")
+    return [(published_ts(news), news) for news in google_news.get_news(topic) or []]
+
+def get_feed(topic, count=article_count, wait=True):
+    if topic not in feed_futures:
+        feed_futures[topic] = feed_executor.submit(fetch_feed, topic, count)
+    return feed_futures[topic].result() if wait else None
+
+def news_in_period(feed, period_hours, count):
+    cutoff = time.time() - period_hours * 3600
+    # undated items only show up in the widest period, the one they were fetched for
+    return [news for ts, news in feed if (ts is None and period_hours >= max_period_hours) or (ts is not None and ts >= cutoff)][:count]
+
+def read_topics():
+    if os.path.isfile(topics_file):
+        return pd.read_csv(topics_file, index_col='Unnamed: 0')
+    return pd.DataFrame(columns=['topic', 'status'])  # Define the variable with a default value
+
+def prefetch_next_topic(count):
+    # pick the topic to switch to now, so its feed is ready when the current one runs dry
+    global prefetched_topic
+    topics_list = read_topics().query("status == 'pending'")['topic'].values.tolist()
+    if prefetched_topic in topics_list or not topics_list:
+        return
+    prefetched_topic = random.choice(topics_list)
+    get_feed(prefetched_topic, count, wait=False)
+
 def topic_selection_tool(topics_list: Annotated[list, "The list of topics"] = None) -> str:
     #set df_topics topic column from the topics_list and set status to pending if it's not already in the df_topics
-    if os.path.isfile(topics_file):
-        df_topics = pd.read_csv(topics_file, index_col='Unnamed: 0')
-    else:
-        df_topics = pd.DataFrame(columns=['topic', 'status'])  # Define the variable with a default value
+    df_topics = read_topics()
     if topics_list:
         for topic in topics_list:
             if topic not in df_topics['topic'].values:
@@ -124,27 +172,21 @@ def topic_selection_tool(topics_list: Annotated[list, "The list of topics"] = No
     if(len(topics_list) == 0):
         return "No more topics to select"
     
-    topic_selected = random.choice(topics_list)
+    topic_selected = prefetched_topic if prefetched_topic in topics_list else random.choice(topics_list)
     df_topics.loc[df_topics['topic'] == topic_selected, 'status'] = 'selected'
     
     df_topics.to_csv(topics_file)
     return topic_selected
 
 def get_news_article_tool(topic: Annotated[str, "The topic to collect news on"], count: Annotated[int, "The number of news articles to collect from the internet"]) -> str:
-    google_news = GNews()
-    google_news.max_results = count  # number of responses across a keyword
-    google_news.language = 'english'  # News in a specific language
-    google_news.country = news_country  # News from a specific country
     period_hours = 1
     
     while True:
-        google_news.period = f'{period_hours}h'  # Adjust period in hours
-        news_list = google_news.get_news(topic)
+        news_list = news_in_period(get_feed(topic, count), period_hours, count)  # Adjust period in hours
         news, article = select_random_article(news_list)
 
         if news and article:
-            s = Shortener(timeout=5)
-            short_url = s.tinyurl.short(news['url'])
+            short_url = short_url_service.shorten(news['url'])
 
             result = (
     """TITLE: {title}
@@ -157,9 +199,14 @@ SOURCE: {url}"""
                 content=article.text.replace('\n\n', '\n'),
                 url=short_url
             )
+            print(f"Feed requests: {feed_requests}")
             return result
+        if period_hours == 1:
+            prefetch_next_topic(count)
         if period_hours >= max_period_hours:
             topic = topic_selection_tool(None)
+            if topic == "No more topics to select":
+                return "No news found on any of the topics"
             period_hours = 0
         period_hours += 1  # Increase the period by 1 hour and try again
     
@@ -190,7 +237,7 @@ def write_tweet_tool(tweet: Annotated[str, "The tweet to post"], source: Annotat
 
     try:
         if RELEASE != "DEV":
-            x_client.create_tweet(
+            x_session.get_client().create_tweet(
                 text=tweet,
             )
         
@@ -265,14 +312,16 @@ try:
                 "message": f"Generate a list of {topic_count} topics related to the topic '{keyword}' and return a random topic from the list.",
                 "clear_history": True,
                 "silent": False,
-                "summary_method": "last_msg"
+                "summary_method": "last_msg",
+                "cache": llm_cache
             },
             {
                 "recipient": news_collector_agent,
                 "message": f"Collect {article_count} news articles about the given topic from the internet.",
                 "clear_history": True,
                 "silent": False,
-                "summary_method": "last_msg"
+                "summary_method": "last_msg",
+                "cache": llm_cache
             },
             # {
             #     "recipient": news_picker_agent,
@@ -293,9 +342,17 @@ try:
                 "message": "Write and post a twitter post about the given news article and link to the source.",
                 "clear_history": True,
                 "silent": False,
-                "summary_method": "last_msg"
+                "summary_method": "last_msg",
+                "cache": llm_cache
             }
         ]
     )
 except Exception as e:
     print(f"Global Error: {str(e)}")
+finally:
+    if x_session.metrics:
+        print(f"X session: {x_session.metrics}")
+    feed_executor.shutdown(wait=False, cancel_futures=True)
+    url_ledger.flush()
+    print(f"Ledger compacted, {url_ledger.compact()} expired rows removed")
+    llm_cache.close()
@@ -0,0 +1,134 @@
+"""On-disk cache of article pages and their parse results.
+
+Each url keeps its compressed HTML, the extracted title, text and publish
+date, and the ETag and Last-Modified headers of the response. A page fetched
+within `fresh_seconds` is served without a request. Older pages are
+revalidated with a conditional request, and when the server answers 304 or
+sends the same body again, the stored parse is reused instead of running
+the extractor. Failed fetches are remembered for `failure_ttl` seconds so a
+broken page is not retried on every run.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+from datetime import datetime
+
+CachedPage = namedtuple('CachedPage', ['url', 'html', 'title', 'text', 'publish_date', 'etag', 'last_modified',
+                                       'digest', 'fetched'])
+
+
+def _digest(html: str) -> str:
+    return hashlib.blake2b(html.encode('utf-8', 'replace'), digest_size=16).hexdigest()
+
+
+class ArticleCache:
+    def __init__(self, path: str, fresh_seconds: float = 3600, failure_ttl: float = 3600, max_age_days: float = 7):
+        self.path = path
+        self.fresh_seconds = fresh_seconds
+        self.failure_ttl = failure_ttl
+        self.max_age = max_age_days * 24 * 3600
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            'url TEXT PRIMARY KEY, html BLOB, title TEXT, text TEXT, publish_date TEXT, etag TEXT, '
+            'last_modified TEXT, digest TEXT, fetched REAL)'
+        )
+        self._db.execute('CREATE TABLE IF NOT EXISTS failures (url TEXT PRIMARY KEY, error TEXT, ts REAL)')
+        self._prune()
+        self._db.commit()
+
+    def get(self, url: str):
+        """Return the CachedPage for `url`, or None."""
+        with self._lock:
+            row = self._db.execute('SELECT * FROM pages WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        url, html, title, text, publish_date, etag, last_modified, digest, fetched = row
+        publish_date = datetime.fromisoformat(publish_date) if publish_date else None
+        return CachedPage(url, zlib.decompress(html).decode(), title, text, publish_date, etag, last_modified,
+                          digest, fetched)
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        return time.time() - page.fetched < self.fresh_seconds
+
+    @staticmethod
+    def conditional_headers(page: CachedPage) -> dict:
+        headers = {}
+        if page is not None and page.etag:
+            headers['If-None-Match'] = page.etag
+        if page is not None and page.last_modified:
+            headers['If-Modified-Since'] = page.last_modified
+        return headers
+
+    def recent_failure(self, url: str):
+        """Return the error of a fetch of `url` that failed within `failure_ttl`, or None."""
+        with self._lock:
+            row = self._db.execute('SELECT error FROM failures WHERE url = ? AND ts > ?',
+                                   (url, time.time() - self.failure_ttl)).fetchone()
+        return row[0] if row else None
+
+    def record_failure(self, url: str, error: str):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO failures VALUES (?, ?, ?)', (url, error, time.time()))
+            self._db.commit()
+
+    def touch(self, url: str, etag: str = None, last_modified: str = None):
+        """Mark the stored page of `url` as just revalidated and return it."""
+        with self._lock:
+            self._db.execute(
+                'UPDATE pages SET fetched = ?, etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) '
+                'WHERE url = ?', (time.time(), etag, last_modified, url)
+            )
+            self._db.execute('DELETE FROM failures WHERE url = ?', (url,))
+            self._db.commit()
+        return self.get(url)
+
+    def store(self, url: str, html: str, etag: str = None, last_modified: str = None) -> CachedPage:
+        """Store a downloaded page and return it.
+
+        The parse of the previous version is kept when the body is unchanged,
+        otherwise the returned page has no text yet and needs `store_parse`.
+        """
+        digest = _digest(html)
+        with self._lock:
+            # only the digest, the previous html isn't decompressed to compare it
+            previous = self._db.execute('SELECT digest FROM pages WHERE url = ?', (url,)).fetchone()
+        if previous is not None and previous[0] == digest:
+            return self.touch(url, etag, last_modified)
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO pages VALUES (?, ?, NULL, NULL, NULL, ?, ?, ?, ?)',
+                (url, zlib.compress(html.encode(), 6), etag, last_modified, digest, time.time())
+            )
+            self._db.execute('DELETE FROM failures WHERE url = ?', (url,))
+            self._db.commit()
+        return CachedPage(url, html, None, None, None, etag, last_modified, digest, time.time())
+
+    def store_parse(self, url: str, title: str, text: str, publish_date=None):
+        publish_date = publish_date.isoformat() if isinstance(publish_date, datetime) else None
+        with self._lock:
+            self._db.execute('UPDATE pages SET title = ?, text = ?, publish_date = ? WHERE url = ?',
+                             (title, text, publish_date, url))
+            self._db.commit()
+
+    def _prune(self):
+        now = time.time()
+        self._db.execute('DELETE FROM pages WHERE fetched < ?', (now - self.max_age,))
+        self._db.execute('DELETE FROM failures WHERE ts < ?', (now - self.failure_ttl,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            pages, size = self._db.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(html)), 0) FROM pages').fetchone()
+            failures = self._db.execute('SELECT COUNT(*) FROM failures').fetchone()[0]
+        return {'pages': pages, 'bytes': size, 'failures': failures}
+
+    def close(self) -> None:
+        with self._lock:
+            self._prune()
+            self._db.commit()
+            self._db.close()
@@ -0,0 +1,64 @@
+"""Cold-start budget check for a DEV run of v2/main.py.
+
+Imports the pipeline module in a fresh interpreter under `python -X importtime`
+(from a scratch directory so the run's .cache is thrown away) and fails when
+the cumulative import time exceeds the budget or when any of the heavy
+clients is imported before a run actually needs it.
+
+    python v2/benchmarks/importtime.py [--budget-ms 500] [--repeat 3]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+V2_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ['autogen', 'twikit', 'gnews', 'newspaper', 'pandas', 'pyshorteners']
+_LINE_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def measure(module: str = 'main') -> dict:
+    """Return `{module_name: cumulative_us}` for one cold import of `module`."""
+    env = dict(os.environ, RELEASE='DEV', ARTICLE_COUNT=os.getenv('ARTICLE_COUNT', '5'),
+               PYTHONPATH=os.pathsep.join([V2_DIR, os.getenv('PYTHONPATH', '')]))
+    with tempfile.TemporaryDirectory() as cwd:
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                cwd=cwd, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    timings = {}
+    for line in result.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            timings[match.group(4)] = int(match.group(2))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('IMPORT_BUDGET_MS', 500)))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.repeat)]
+    best_ms = min(run['main'] for run in runs) / 1000
+    eager = sorted(name for name in runs[0] if name.split('.')[0] in LAZY_MODULES and '.' not in name)
+    slowest = sorted(runs[0].items(), key=lambda item: item[1], reverse=True)[1:6]
+
+    print(f"cold import of main: {best_ms:.1f} ms (budget {args.budget_ms:.0f} ms, best of {args.repeat})")
+    for name, us in slowest:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+    failed = False
+    if eager:
+        print(f"FAIL: imported at startup: {', '.join(eager)}")
+        failed = True
+    if best_ms > args.budget_ms:
+        print("FAIL: over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+"""Offline end-to-end benchmark of the v2 news-to-tweet pipeline.
+
+Every external service is replaced by a deterministic local stand-in with
+configurable latency and failure rate:
+
+- Google News: a fake GNews returning `--articles` publisher urls per topic
+- publisher sites: generated HTML pages, parsed by the real newspaper code
+- Groq: an OpenAI-compatible chat-completions server on localhost that
+  answers JSON-mode requests with the tweets, and the tweet writer agent
+  with a `write_tweet_tool` call, then TERMINATE
+- TinyURL: a fake shortener
+- X: a tweet sink
+
+The harness drives `stream_news_batches` -> `write_batch` (`--write-mode`) ->
+`write_tweet_tool` for each topic count, each in a fresh scratch directory,
+and reports throughput, time to the first tweet and per-stage latency.
+Topic throughput counts the topics actually queried: a run stops taking
+topics once it has as many articles as its prompts can hold.
+`--batch-size 0` runs the phased flow (one prompt after all downloads) for
+comparison, and `--profiles N` serves N bot profiles from the same caches.
+
+    python v2/benchmarks/pipeline.py [--topics 10 100 1000] [--batch-size 8] [--profiles 1] [--json report.json]
+"""
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+V2_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL = 'llama3-70b-8192'
+# newspaper scores paragraphs by stopword density, so the generated prose needs plenty of them
+WORDS = ('model data research training inference benchmark release company chip policy safety agent '
+         'language vision robot cloud startup funding paper open source compute energy regulation').split() + \
+        'the of and to in is that for with as on it was by this from at are be have'.split() * 2
+
+
+def _fraction(*parts) -> float:
+    """Deterministic pseudo-random number in [0, 1) for the given key, independent of thread order."""
+    digest = hashlib.blake2b('|'.join(map(str, parts)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 64
+
+
+class Service:
+    """Latency and failure injection shared by the fakes."""
+
+    def __init__(self, name: str, latency: float, failure_rate: float, seed: int):
+        self.name = name
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def call(self, key):
+        with self._lock:
+            self.calls += 1
+        # +-50% jitter around the configured latency
+        time.sleep(self.latency * (0.5 + _fraction(self.seed, self.name, 'latency', key)))
+        if _fraction(self.seed, self.name, 'failure', key) < self.failure_rate:
+            with self._lock:
+                self.failures += 1
+            raise ConnectionError(f"{self.name} failed for {key}")
+
+
+class FakeGNews:
+    def __init__(self, service: Service, articles_per_topic: int, publishers: int):
+        self.service = service
+        self.articles_per_topic = articles_per_topic
+        self.publishers = publishers
+
+    def get_news(self, keyword):
+        try:
+            self.service.call(keyword)
+        except ConnectionError:
+            return []  # GNews swallows feed errors and returns no items
+        slug = re.sub(r'\W+', '-', keyword.lower())
+        return [
+            {'guid': f'{slug}-{i}', 'title': f'{keyword} story {i}', 'url': f'https://publisher-{int(_fraction(slug, i) * self.publishers)}.example/{slug}/{i}'}
+            for i in range(self.articles_per_topic)
+        ]
+
+    def poll(self, keyword, conditional_headers):
+        # the fake feed never answers 304
+        return f'https://news.example/{keyword}', None, None, self.get_news(keyword)
+
+
+class FakePages:
+    def __init__(self, service: Service, paragraphs: int, duplicate_rate: float):
+        self.service = service
+        self.paragraphs = paragraphs
+        self.duplicate_rate = duplicate_rate
+
+    def fetch(self, url: str) -> str:
+        self.service.call(url)
+        # a share of the pages carry one of a few syndicated wire stories
+        story = url
+        if _fraction(url, 'syndicated') < self.duplicate_rate:
+            story = f'wire-{int(_fraction(url, "wire") * 10)}'
+        words = [WORDS[int(_fraction(story, i) * len(WORDS))] for i in range(self.paragraphs * 60)]
+        paragraphs = ''.join(f'<p>{" ".join(words[i:i + 60]).capitalize()}.</p>\n' for i in range(0, len(words), 60))
+        return (f'<html><head><title>{url.rsplit("/", 2)[-2]} news</title></head><body>'
+                f'<h1>{url.rsplit("/", 2)[-2]} news</h1><article>{paragraphs}</article></body></html>')
+
+
+class FakeShortener:
+    def __init__(self, service: Service):
+        self.service = service
+        self.tinyurl = self
+
+    def short(self, url):
+        self.service.call(url)
+        return 'https://tinyurl.com/' + hashlib.md5(url.encode()).hexdigest()[:8]
+
+
+class TweetSink:
+    def __init__(self, service: Service):
+        self.service = service
+        self.tweets = []
+        self.start = None
+        self.first_tweet = None  # seconds from `start` to the first posted tweet
+
+    def post(self, text, reply_to):
+        self.service.call(text)
+        if self.first_tweet is None and self.start is not None:
+            self.first_tweet = time.perf_counter() - self.start
+        tweet = type('Tweet', (), {'id': str(len(self.tweets) + 1)})()
+        self.tweets.append((tweet.id, reply_to, text))
+        return tweet
+
+
+def chat_server(service: Service):
+    """Start an OpenAI-compatible chat-completions stub and return the server."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            messages = request['messages']
+            try:
+                service.call(len(messages))
+                status, body = 200, self._completion(messages, request.get('response_format'))
+            except ConnectionError as e:
+                status, body = 503, {'error': {'message': str(e)}}
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _completion(self, messages, response_format):
+            prompt = ' '.join(str(message.get('content') or '') for message in messages)
+            titles = re.findall(r'NEWS \d+ TITLE: (.*)', prompt)
+            sources = re.findall(r'NEWS \d+ SOURCE: (.*)', prompt)
+            if response_format:
+                tweets = [{'tweet': f'{title[:200]}.', 'source': source} for title, source in zip(titles, sources)]
+                message = {'role': 'assistant', 'content': json.dumps({'tweets': tweets})}
+            elif messages[-1]['role'] == 'tool':
+                message = {'role': 'assistant', 'content': 'TERMINATE'}
+            else:
+                arguments = {'tweet_list': [f'{title[:200]}.' for title in titles], 'source_list': sources}
+                message = {'role': 'assistant', 'content': None, 'tool_calls': [{
+                    'id': f'call_{len(messages)}', 'type': 'function',
+                    'function': {'name': 'write_tweet_tool', 'arguments': json.dumps(arguments)}
+                }]}
+            prompt_tokens = len(prompt) // 4
+            completion_tokens = len(json.dumps(message)) // 4
+            return {
+                'id': f'chatcmpl-{len(messages)}', 'object': 'chat.completion', 'created': int(time.time()), 'model': MODEL,
+                'choices': [{'index': 0, 'message': message, 'finish_reason': 'tool_calls' if message.get('tool_calls') else 'stop'}],
+                'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                          'total_tokens': prompt_tokens + completion_tokens},
+            }
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def wrap(self, stage: str, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.samples[stage].append(time.perf_counter() - start)
+        return timed
+
+    def summary(self) -> dict:
+        report = {}
+        for stage, samples in self.samples.items():
+            ordered = sorted(samples)
+            report[stage] = {
+                'calls': len(ordered),
+                'total_s': round(sum(ordered), 4),
+                'p50_ms': round(ordered[len(ordered) // 2] * 1000, 2),
+                'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+            }
+        return report
+
+
+def load_pipeline(name: str):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(V2_DIR, 'main.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_once(topic_count: int, args, services: dict) -> dict:
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        if args.profiles > 1:
+            # profiles with the same keyword and topics, so every url is wanted by all of them
+            with open('profiles.json', 'w', encoding='utf-8') as f:
+                json.dump([{'name': f'bot{i}', 'keyword': 'AI'} for i in range(args.profiles)], f)
+            os.environ['PROFILES'] = 'profiles.json'
+        try:
+            pipeline = load_pipeline(f'pipeline_{topic_count}')
+            os.environ.pop('PROFILES', None)
+            timer = StageTimer()
+            gnews = FakeGNews(services['feed'], args.articles, args.publishers)
+            pages = FakePages(services['page'], args.paragraphs, args.duplicate_rate)
+            sink = TweetSink(services['tweet'])
+
+            def download_page(article, page, url):
+                # stands in for the HTTP request only, fetch_page still goes through the article cache
+                try:
+                    html = timer.wrap('article download', pages.fetch)(article.url)
+                except Exception as e:
+                    pipeline.article_cache.record_failure(url, str(e))
+                    raise
+                article.download(input_html=html)
+                return pipeline.article_cache.store(url, article.html)
+
+            pipeline.get_google_news = lambda country=None: gnews
+            pipeline.fetch_feed = timer.wrap('feed fetch', pipeline.fetch_feed)
+            pipeline.download_page = download_page
+            pipeline.short_url_service._shortener = FakeShortener(services['shortener'])
+            pipeline.short_url_service.shorten_many = timer.wrap('shorten', pipeline.short_url_service.shorten_many)
+            pipeline.pack_articles = timer.wrap('pack prompt', pipeline.pack_articles)
+            pipeline.post_tweet = timer.wrap('tweet post', sink.post)
+
+            topics = [f'Topic {i}' for i in range(topic_count)]
+            since = pipeline.metrics.snapshot()
+            start = sink.start = time.perf_counter()
+            # batch size 0 sends every article in one prompt after all downloads, as get_news_articles_tool does
+            batch_size, max_wait = (args.batch_size, args.batch_wait) if args.batch_size else (None, None)
+            write_batch = timer.wrap('write batch', pipeline.write_batch)
+            for profile in pipeline.profiles:
+                pipeline.profile = profile
+                for news_articles in pipeline.stream_news_batches(topics, batch_size=batch_size, max_wait=max_wait):
+                    write_batch(news_articles)
+            elapsed = time.perf_counter() - start
+            metrics = pipeline.metrics.report(since)
+            pipeline.llm_cache.close()
+            pipeline.article_cache.close()
+            pipeline.parse_pool.close()
+        finally:
+            os.chdir(cwd)
+
+    articles_read = metrics['counters'].get('articles_total{status="success"}', 0)
+    # feed workers stop taking topics once the run's article limit is reached, so count the topics actually queried
+    topics_queried = len(timer.samples['feed fetch'])
+    return {
+        'topics': topic_count,
+        'topics_queried': topics_queried,
+        'profiles': len(pipeline.profiles),
+        'page_downloads': len(timer.samples['article download']),
+        'article_parses': metrics['histograms'].get('article_parse_seconds', {}).get('count', 0),
+        'seconds': round(elapsed, 3),
+        'first_tweet_s': round(sink.first_tweet, 3) if sink.first_tweet is not None else None,
+        'topics_per_s': round(topics_queried / elapsed, 2),
+        'articles_per_s': round(articles_read / elapsed, 2),
+        'articles_read': articles_read,
+        'tweets_posted': len(sink.tweets),
+        'stages': timer.summary(),
+        'metrics': metrics,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmark of the v2 pipeline.')
+    parser.add_argument('--topics', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--articles', type=int, default=5, help='feed items per topic')
+    parser.add_argument('--publishers', type=int, default=40, help='distinct publisher hosts')
+    parser.add_argument('--paragraphs', type=int, default=8, help='paragraphs per article page')
+    parser.add_argument('--duplicate-rate', type=float, default=0.1, help='share of pages that are syndicated copies')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=8, help='articles per prompt, 0 for one prompt after all downloads')
+    parser.add_argument('--batch-wait', type=float, default=10, help='seconds before a partial batch is sent')
+    parser.add_argument('--write-mode', choices=['direct', 'agent'], default='direct')
+    parser.add_argument('--profiles', type=int, default=1, help='bot profiles served by the process')
+    for name, latency, failure_rate in [('feed', 0.05, 0.02), ('page', 0.1, 0.05), ('shortener', 0.05, 0.02),
+                                        ('llm', 0.3, 0.0), ('tweet', 0.05, 0.0)]:
+        parser.add_argument(f'--{name}-latency', type=float, default=latency, help='seconds, jittered +-50%%')
+        parser.add_argument(f'--{name}-failure-rate', type=float, default=failure_rate)
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    services = {name: Service(name, getattr(args, f'{name}_latency'), getattr(args, f'{name}_failure_rate'), args.seed)
+                for name in ['feed', 'page', 'shortener', 'llm', 'tweet']}
+    server = chat_server(services['llm'])
+    os.environ.update({
+        'RELEASE': 'DEV',
+        'ARTICLE_COUNT': str(args.articles),
+        'GROQ_MODEL_NAME': MODEL,
+        'GROQ_API_KEY': 'offline',
+        'GROQ_API_BASE': f'http://127.0.0.1:{server.server_address[1]}/v1',
+        'WRITE_MODE': args.write_mode,
+    })
+    # the fakes have no rate limits of their own
+    os.environ.setdefault('FEED_RATE', '0')
+    sys.path.insert(0, V2_DIR)
+
+    reports = []
+    for topic_count in args.topics:
+        report = run_once(topic_count, args, services)
+        reports.append(report)
+        print(f"\n{topic_count} topics ({report['topics_queried']} queried over all profiles) x {report['profiles']} profiles: {report['seconds']}s, "
+              f"first tweet after {report['first_tweet_s']}s, {report['topics_per_s']} topics/s, "
+              f"{report['articles_per_s']} articles/s, {report['articles_read']} articles, {report['tweets_posted']} tweets, "
+              f"{report['page_downloads']} page downloads, {report['article_parses']} parses")
+        for stage, stats in report['stages'].items():
+            print(f"  {stage:24} {stats['calls']:6} calls  total {stats['total_s']:8.3f}s  "
+                  f"p50 {stats['p50_ms']:8.2f}ms  p95 {stats['p95_ms']:8.2f}ms")
+    server.shutdown()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
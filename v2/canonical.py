@@ -0,0 +1,73 @@
+"""Canonical article URLs, so variants of one article share a single key.
+
+Feeds link the same article with tracking parameters, AMP and mobile pages,
+`http://` and trailing slashes. `canonicalize_url` maps those variants to one
+URL, which the url ledger and the article cache are keyed by. It is only a
+key: the link from the feed is what gets downloaded, since a rewritten host
+or path doesn't always exist. `canonical_link` reads the `<link rel=canonical>` a page
+declares for itself.
+"""
+import functools
+import re
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
+
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'igshid', 'mc_cid', 'mc_eid', 'ocid', 'cmpid', 'smid', 'taid',
+    'ref', 'ref_src', 'ref_url', 'referrer', 'guccounter', 'guce_referrer', 'guce_referrer_sig', 'ncid',
+    'sr_share', 'ito', 'ss', '_ga', '_gl', 'amp', 'outputtype',
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'mtm_', 'at_', 'hsa_')
+MOBILE_HOST_PREFIXES = ('m.', 'mobile.', 'amp.')
+
+_AMP_CACHE_RE = re.compile(r'^/[cv]/(?:s/)?(?P<url>[^/]+/.*)$')  # https://<domain>.cdn.ampproject.org/c/s/<url>
+_AMP_PATH_RE = re.compile(r'(?:/amp/?$|/amp(?=/)|\.amp(?=\.html?$))')
+_CANONICAL_LINK_RE = re.compile(r'<link\b[^>]*\brel=["\']?canonical\b[^>]*>', re.IGNORECASE)
+_HREF_RE = re.compile(r'\bhref=["\']?([^"\'\s>]+)', re.IGNORECASE)
+
+
+@functools.lru_cache(8192)
+def canonicalize_url(url: str) -> str:
+    """Return the canonical form of an article URL; URLs that aren't valid http(s) are returned unchanged."""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url  # a malformed port or IPv6 host, keyed as it is
+    scheme = parts.scheme.lower()
+    if scheme not in ('http', 'https') or not parts.hostname:
+        return url
+    host, path = parts.hostname.rstrip('.'), parts.path
+
+    # pages served from the Google AMP cache embed the publisher's url in the path
+    if host.endswith('.cdn.ampproject.org'):
+        match = _AMP_CACHE_RE.match(path)
+        if match:
+            return canonicalize_url(f"https://{match.group('url')}{'?' + parts.query if parts.query else ''}")
+
+    if host.startswith(MOBILE_HOST_PREFIXES) and host.count('.') > 1:
+        host = 'www.' + host.split('.', 1)[1]
+    port = f':{port}' if port not in (None, 80, 443) else ''
+
+    path = _AMP_PATH_RE.sub('', path)
+    path = re.sub(r'/{2,}', '/', path).rstrip('/') or '/'
+
+    params = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    query = urlencode(sorted(params), quote_via=quote)
+    return urlunsplit(('https', host + port, path, query, ''))
+
+
+def canonical_link(html: str, max_chars: int = 200000):
+    """Return the canonical URL a page declares in its `<head>`, or None."""
+    head = html[:max_chars]
+    end = head.lower().find('</head>')
+    for tag in _CANONICAL_LINK_RE.findall(head if end < 0 else head[:end]):
+        match = _HREF_RE.search(tag)
+        if match and match.group(1).startswith(('http://', 'https://')):
+            url = canonicalize_url(match.group(1).replace('&amp;', '&'))
+            # some sites declare their home page as the canonical url of every article
+            return url if urlsplit(url).path != '/' else None
+    return None
@@ -0,0 +1,131 @@
+"""Near-duplicate detection for syndicated news articles.
+
+Each article gets a 64-bit SimHash over word shingles of its title and text.
+Articles whose hashes differ in at most `max_distance` bits are clustered,
+and every cluster collapses to one representative carrying the merged
+keywords of the whole cluster.
+"""
+import hashlib
+import re
+from collections import Counter
+
+HASH_BITS = 64
+_WORD_RE = re.compile(r'\w+')
+
+
+def _shingles(text: str, size: int = 3, max_words: int = 2000) -> Counter:
+    words = _WORD_RE.findall(text.lower())[:max_words]
+    if len(words) < size:
+        return Counter([' '.join(words)]) if words else Counter()
+    return Counter(' '.join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+def simhash(text: str) -> int:
+    weights = [0] * HASH_BITS
+    for shingle, count in _shingles(text).items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'big')
+        for bit in range(HASH_BITS):
+            weights[bit] += count if h >> bit & 1 else -count
+    return sum(1 << bit for bit in range(HASH_BITS) if weights[bit] > 0)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def cluster_near_duplicates(hashes: list, max_distance: int = 3) -> list:
+    """Group indices of `hashes` whose pairwise distance is at most `max_distance`.
+
+    Candidates are found by splitting each hash into `max_distance + 1` bands:
+    two hashes within the distance must agree exactly on at least one band.
+    Clusters are returned in order of their first member.
+    """
+    parent = list(range(len(hashes)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    bands = max_distance + 1
+    band_bits = HASH_BITS // bands
+    for band in range(bands):
+        shift = band * band_bits
+        mask = (1 << band_bits) - 1 if band < bands - 1 else (1 << (HASH_BITS - shift)) - 1
+        buckets = {}
+        for i, h in enumerate(hashes):
+            buckets.setdefault(h >> shift & mask, []).append(i)
+        for members in buckets.values():
+            for x, i in enumerate(members):
+                for j in members[x + 1:]:
+                    if find(i) != find(j) and hamming_distance(hashes[i], hashes[j]) <= max_distance:
+                        parent[find(j)] = find(i)
+
+    clusters = {}
+    for i in range(len(hashes)):
+        clusters.setdefault(find(i), []).append(i)
+    return sorted(clusters.values(), key=lambda cluster: cluster[0])
+
+
+def merge_keywords(keywords: list) -> str:
+    merged = []
+    for keyword in keywords:
+        for part in keyword.split(', '):
+            if part not in merged:
+                merged.append(part)
+    return ', '.join(merged)
+
+
+def collapse_near_duplicates(articles: list, max_distance: int = 3) -> list:
+    """Return one article per near-duplicate cluster, in original order.
+
+    The representative is the cluster member with the longest text, and its
+    `keyword` becomes the merged keywords of every member.
+    """
+    hashes = [simhash(f'{article.title}\n{article.text}') for article in articles]
+    representatives = []
+    for cluster in cluster_near_duplicates(hashes, max_distance):
+        members = [articles[i] for i in cluster]
+        representative = max(members, key=lambda article: len(article.text))
+        representative.keyword = merge_keywords([article.keyword for article in members])
+        representatives.append(representative)
+    return representatives
+
+
+class NearDuplicateFilter:
+    """Drops articles that are near-duplicates of articles let through earlier.
+
+    Used when articles arrive in batches: each batch is collapsed on its own
+    and then checked against the hashes of every earlier batch.
+    """
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = HASH_BITS // self.bands
+        self._index = [{} for _ in range(self.bands)]  # band -> {band value: [hashes]}
+
+    def _band_values(self, h: int):
+        for band in range(self.bands):
+            shift = band * self.band_bits
+            bits = self.band_bits if band < self.bands - 1 else HASH_BITS - shift
+            yield band, h >> shift & (1 << bits) - 1
+
+    def seen(self, h: int) -> bool:
+        return any(hamming_distance(h, other) <= self.max_distance
+                   for band, value in self._band_values(h) for other in self._index[band].get(value, ()))
+
+    def add(self, h: int):
+        for band, value in self._band_values(h):
+            self._index[band].setdefault(value, []).append(h)
+
+    def filter(self, articles: list) -> list:
+        """Collapse `articles` and return those not already seen, remembering them."""
+        fresh = []
+        for article in collapse_near_duplicates(articles, self.max_distance):
+            h = simhash(f'{article.title}\n{article.text}')
+            if not self.seen(h):
+                self.add(h)
+                fresh.append(article)
+        return fresh
@@ -0,0 +1,109 @@
+"""Extractive summaries of article text for the tweet writer prompt.
+
+Instead of cutting each article after its first characters (often bylines
+and boilerplate), the sentences of every article in a batch are ranked with
+TextRank over TF-IDF sentence vectors, and each article keeps its best
+sentences, in their original order, within its token share. Term weights are
+computed once over all sentences of the batch, and sentences repeated within
+an article or across articles (newsletter prompts, cookie notices) are left
+out.
+"""
+import re
+from collections import Counter
+
+from prompt import count_tokens, truncate_to_tokens
+
+_PARAGRAPH_RE = re.compile(r'\n+')
+_SENTENCE_RE = re.compile(r'(?<=[.!?])["”\')\]]*\s+(?=["“\'(\[]?[A-Z0-9])')
+_WORD_RE = re.compile(r'[a-z0-9]+')
+MIN_SENTENCE_WORDS = 4
+
+
+def split_sentences(text: str) -> list:
+    sentences = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        sentences += [sentence.strip() for sentence in _SENTENCE_RE.split(paragraph) if sentence.strip()]
+    return sentences
+
+
+def _textrank(similarity, damping: float = 0.85, iterations: int = 50, tolerance: float = 1e-6):
+    import numpy as np
+
+    n = similarity.shape[0]
+    totals = similarity.sum(axis=1, keepdims=True)
+    # a sentence similar to nothing spreads its rank evenly
+    transition = np.where(totals > 0, similarity / np.where(totals > 0, totals, 1), 1 / n)
+    rank = np.full(n, 1 / n)
+    for _ in range(iterations):
+        updated = (1 - damping) / n + damping * transition.T @ rank
+        if np.abs(updated - rank).sum() < tolerance:
+            return updated
+        rank = updated
+    return rank
+
+
+def _select(sentences: list, scores, budget: int) -> str:
+    # best sentences first while they fit, then back in reading order
+    chosen, used = [], 0
+    for i in sorted(range(len(sentences)), key=lambda i: -scores[i]):
+        tokens = count_tokens(sentences[i])
+        if used + tokens <= budget:
+            chosen.append(i)
+            used += tokens
+    if not chosen:
+        return truncate_to_tokens(sentences[int(scores.argmax())], budget)
+    return ' '.join(sentences[i] for i in sorted(chosen))
+
+
+def summarize_articles(texts: list, budgets: list) -> list:
+    """Return each of `texts` reduced to its most central sentences within `budgets[i]` tokens."""
+    import numpy as np
+
+    summaries = list(texts)
+    split = [split_sentences(text) if count_tokens(text) > budget else [] for text, budget in zip(texts, budgets)]
+    # a sentence repeated within an article or found in several articles is boilerplate, not content
+    articles_with = Counter(sentence for sentences in split for sentence in set(sentences))
+    candidates = []  # (article index, sentences) of the texts that need shrinking
+    for i, text in enumerate(texts):
+        if not split[i]:
+            continue
+        repeats = Counter(split[i])
+        sentences = [sentence for sentence in split[i] if repeats[sentence] == 1 and articles_with[sentence] == 1
+                     and len(_WORD_RE.findall(sentence.lower())) >= MIN_SENTENCE_WORDS]
+        if len(sentences) < 2:
+            summaries[i] = truncate_to_tokens(text, budgets[i])
+            continue
+        candidates.append((i, sentences))
+    if not candidates:
+        return summaries
+
+    # one vocabulary and one set of sentence frequencies for the whole batch
+    vocabulary, term_ids, lengths = {}, [], []
+    for _, sentences in candidates:
+        for sentence in sentences:
+            words = _WORD_RE.findall(sentence.lower())
+            term_ids += [vocabulary.setdefault(word, len(vocabulary)) for word in words]
+            lengths.append(len(words))
+    term_ids = np.array(term_ids, dtype=np.int64)
+    lengths = np.array(lengths, dtype=np.int64)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    pairs = np.unique(rows * len(vocabulary) + term_ids)
+    sentence_frequency = np.bincount(pairs % len(vocabulary), minlength=len(vocabulary))
+    idf = np.log(len(lengths) / sentence_frequency)
+
+    term_offsets = np.concatenate([[0], np.cumsum(lengths)])
+    first_sentence = 0
+    for i, sentences in candidates:
+        last_sentence = first_sentence + len(sentences)
+        start, end = term_offsets[first_sentence], term_offsets[last_sentence]
+        terms, local_terms = np.unique(term_ids[start:end], return_inverse=True)
+        vectors = np.zeros((len(sentences), len(terms)))
+        np.add.at(vectors, (rows[start:end] - first_sentence, local_terms), 1)
+        vectors *= idf[terms]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1)
+        similarity = vectors @ vectors.T
+        np.fill_diagonal(similarity, 0)
+        summaries[i] = _select(sentences, _textrank(similarity), budgets[i])
+        first_sentence = last_sentence
+    return summaries
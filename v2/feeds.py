@@ -0,0 +1,76 @@
+"""Conditional, incremental polling of the Google News RSS feeds.
+
+For every feed url the ETag and Last-Modified of the last response are
+kept, so an unchanged feed costs a 304 instead of a full body. From a
+changed feed only the items that feed hasn't handed to the pipeline yet are
+returned; an item is seen per feed, so an article found under a second topic
+still reaches the pipeline with that topic. An item counts as seen once the
+pipeline took it (queued it, or found it already processed), and seen items
+are forgotten after `max_age_hours`, by when they have left the feed. Every
+profile keeps its own poller, so what one profile took or got a 304 for
+never hides an item from another. When an item of a feed was returned but
+never taken (the run hit its article limit), the feed's validators are
+dropped, so the next poll gets the whole feed again rather than a 304.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def _key(url: str, guid: str) -> str:
+    # short hashes keep the committed state file small
+    return hashlib.blake2b(f'{url}\n{guid}'.encode(), digest_size=8).hexdigest()
+
+
+class FeedPoller:
+    def __init__(self, path: str, max_age_hours: float = 24):
+        self.path = path
+        self.max_age = max_age_hours * 3600
+        self._lock = threading.Lock()
+        self._validators = {}  # feed url -> {'etag', 'last_modified'}
+        self._seen = {}  # (feed url, guid) key -> ts it was taken
+        self._returned = {}  # feed url -> keys returned as new by this run's polls
+        if os.path.isfile(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self._validators = data.get('validators', {})
+            self._seen = data.get('seen', {})
+
+    def conditional_headers(self, url: str) -> dict:
+        with self._lock:
+            validators = self._validators.get(url, {})
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    def received(self, url: str, etag: str, last_modified: str, guids: list) -> set:
+        """Store the validators of a full response and return the GUIDs of `guids` not seen yet."""
+        with self._lock:
+            self._validators[url] = {'etag': etag, 'last_modified': last_modified}
+            new = {guid for guid in guids if _key(url, guid) not in self._seen}
+            self._returned.setdefault(url, set()).update(_key(url, guid) for guid in new)
+            return new
+
+    def seen(self, url: str, guid: str, now: float = None):
+        with self._lock:
+            self._seen[_key(url, guid)] = int(time.time() if now is None else now)
+
+    def commit(self, now: float = None):
+        """Drop the validators of feeds with items never taken, forget old GUIDs and save."""
+        now = time.time() if now is None else now
+        with self._lock:
+            for url, returned in self._returned.items():
+                if any(key not in self._seen for key in returned):
+                    self._validators.pop(url, None)
+            self._returned = {}
+            cutoff = now - self.max_age
+            self._seen = {key: ts for key, ts in self._seen.items() if ts >= cutoff}
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'validators': self._validators, 'seen': self._seen}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
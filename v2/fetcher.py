@@ -0,0 +1,44 @@
+"""Per-host and rate limits for fetching feeds and article pages."""
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def domain_of(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+class DomainLimiter:
+    """Caps the number of in-flight requests to any single host."""
+
+    def __init__(self, per_domain: int):
+        self.per_domain = max(1, per_domain)
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def slot(self, url: str) -> threading.Semaphore:
+        domain = domain_of(url)
+        with self._lock:
+            if domain not in self._semaphores:
+                self._semaphores[domain] = threading.BoundedSemaphore(self.per_domain)
+            return self._semaphores[domain]
+
+
+class RateLimiter:
+    """Spaces calls to `wait` so they start at most `rate` times per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate and rate > 0 else 0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
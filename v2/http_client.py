@@ -0,0 +1,69 @@
+"""One pooled HTTP session for the feeds, the article pages and the shortener.
+
+Every request goes through a single `requests.Session`, so connections are
+kept alive and reused across Google News queries, publisher pages and
+tinyurl calls instead of paying DNS, TCP and TLS setup each time. Each host
+gets at most `per_host` connections, and all callers share one timeout and
+retry policy: connection errors and 429/5xx answers to GETs are retried with
+backoff, honoring Retry-After.
+"""
+import threading
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HttpClient:
+    def __init__(self, timeout: float = 10, per_host: int = 8, max_hosts: int = 64, retries: int = 2,
+                 backoff: float = 0.5):
+        self.timeout = timeout  # seconds, unless a caller passes its own
+        self.per_host = per_host  # connections kept and allowed at once per host, callers wait for a free one
+        self.max_hosts = max_hosts  # hosts whose connections are kept
+        self.retries = retries
+        self.backoff = backoff
+        self._session = None
+        self._adapter = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # requests is only imported with the first request
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+
+                retry = Retry(total=self.retries, backoff_factor=self.backoff, status_forcelist=RETRY_STATUSES,
+                              allowed_methods=frozenset(['GET', 'HEAD']), raise_on_status=False)
+                self._adapter = HTTPAdapter(pool_connections=self.max_hosts, pool_maxsize=self.per_host,
+                                            pool_block=True, max_retries=retry)
+                session = requests.Session()
+                session.mount('http://', self._adapter)
+                session.mount('https://', self._adapter)
+                self._session = session
+            return self._session
+
+    def get(self, url: str, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def head(self, url: str, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.head(url, **kwargs)
+
+    def stats(self) -> dict:
+        """Requests sent and connections opened by the hosts currently pooled."""
+        if self._adapter is None:
+            return {'hosts': 0, 'requests': 0, 'connections': 0, 'reused': 0}
+        pools = self._adapter.poolmanager.pools
+        # a pool evicted meanwhile is skipped
+        counts = [(pool.num_requests, pool.num_connections) for pool in map(pools.get, pools.keys()) if pool is not None]
+        requests_sent = sum(sent for sent, _ in counts)
+        connections = sum(opened for _, opened in counts)
+        return {'hosts': len(counts), 'requests': requests_sent, 'connections': connections,
+                'reused': max(0, requests_sent - connections)}
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
@@ -0,0 +1,137 @@
+"""Append-only ledger of processed article URLs.
+
+The ledger is a CSV log of `url,status,ts` rows. Every row is kept in memory,
+indexed by url, so seen-checks are a dict lookup. New rows are buffered and
+appended in batches instead of rewriting the file, and `compact` drops rows
+older than the TTL so the committed file stops growing without bound.
+"""
+import csv
+import os
+import threading
+import time
+
+FIELDS = ['url', 'status', 'ts']
+
+
+class UrlLedger:
+    def __init__(self, path: str, ttl_days: float = 30, batch_size: int = 50):
+        self.path = path
+        self.ttl = ttl_days * 24 * 3600
+        self.batch_size = batch_size
+        self._history = {}  # url -> [(status, ts), ...] oldest first
+        self._pending = []
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            self._rewrite([])
+            return
+        with open(self.path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            rows = list(reader)
+        if header == FIELDS:
+            for url, status, ts in rows:
+                self._history.setdefault(url, []).append((status, int(ts)))
+            return
+        # Legacy pandas layout: `,urls,status` with the newest row first and no timestamps.
+        ts = int(os.path.getmtime(self.path))
+        entries = [(row[1], row[2], ts) for row in reversed(rows) if len(row) >= 3]
+        for url, status, ts in entries:
+            self._history.setdefault(url, []).append((status, ts))
+        self._rewrite(entries)
+        print(f"Migrated {len(entries)} legacy rows in {self.path}")
+
+    def _rewrite(self, entries):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            writer.writerows(entries)
+        os.replace(tmp_path, self.path)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._history
+
+    def __len__(self) -> int:
+        return len(self._history)
+
+    def status(self, url: str):
+        """Return the latest status recorded for `url`, or None."""
+        history = self._history.get(url)
+        return history[-1][0] if history else None
+
+    def history(self, url: str) -> list:
+        """Return every `(status, ts)` recorded for `url`, oldest first."""
+        return list(self._history.get(url, []))
+
+    def record(self, url: str, status: str, ts: int = None):
+        with self._lock:
+            ts = int(time.time()) if ts is None else ts
+            self._history.setdefault(url, []).append((status, ts))
+            self._pending.append((url, status, ts))
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """Append the buffered rows to the log in a single write."""
+        with self._lock:
+            if not self._pending:
+                return
+            with open(self.path, 'a', newline='', encoding='utf-8') as f:
+                csv.writer(f).writerows(self._pending)
+            self._pending = []
+
+    def compact(self, now: float = None) -> int:
+        """Drop rows older than the TTL and return how many were removed.
+
+        The file is only rewritten when something actually expired.
+        """
+        with self._lock:
+            self.flush()
+            cutoff = (time.time() if now is None else now) - self.ttl
+            removed = 0
+            for url in list(self._history):
+                kept = [(status, ts) for status, ts in self._history[url] if ts >= cutoff]
+                removed += len(self._history[url]) - len(kept)
+                if kept:
+                    self._history[url] = kept
+                else:
+                    del self._history[url]
+            if removed:
+                entries = sorted(
+                    ((url, status, ts) for url, history in self._history.items() for status, ts in history),
+                    key=lambda entry: entry[2]
+                )
+                self._rewrite(entries)
+            return removed
+
+    def rekey(self, key) -> int:
+        """Re-key every url as `key(url)`, merging the histories that end up
+        under the same key, and return how many urls changed.
+
+        The file is only rewritten when a url actually changed.
+        """
+        with self._lock:
+            self.flush()
+            history = {}
+            changed = 0
+            for url, rows in self._history.items():
+                new_url = key(url)
+                changed += new_url != url
+                history.setdefault(new_url, []).extend(rows)
+            if changed:
+                self._history = {url: sorted(rows, key=lambda row: row[1]) for url, rows in history.items()}
+                entries = sorted(
+                    ((url, status, ts) for url, rows in self._history.items() for status, ts in rows),
+                    key=lambda entry: entry[2]
+                )
+                self._rewrite(entries)
+            return changed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
@@ -0,0 +1,118 @@
+"""Bounded LLM response cache for autogen.
+
+Implements autogen's cache protocol (`get`, `set`, `close` and the context
+manager methods) on a single SQLite file. Entries are keyed on the model
+name, a hash of the tool schema and a hash of the whitespace-normalized
+prompt, stored as compressed pickles, and evicted least-recently-used once
+the file exceeds its size limit or an entry exceeds its age limit.
+"""
+import hashlib
+import json
+import pickle
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _hash(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+def normalize_key(key: str) -> tuple:
+    """Turn autogen's JSON request key into `(model, cache_key)`."""
+    try:
+        params = json.loads(key)
+    except (TypeError, ValueError):
+        return None, _hash(key)
+    model = params.pop('model', None)
+    tools = params.pop('tools', None)
+    for message in params.get('messages', []):
+        if isinstance(message.get('content'), str):
+            message['content'] = _WHITESPACE_RE.sub(' ', message['content']).strip()
+    return model, f'{model}:{_hash(tools)[:16]}:{_hash(params)}'
+
+
+class LLMCache:
+    def __init__(self, path: str, max_bytes: int = 5 * 1024 * 1024, max_age_days: float = 7):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 24 * 3600
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, model TEXT, value BLOB, size INTEGER, created REAL, last_used REAL)'
+        )
+        self._evict()
+        self._db.commit()
+
+    def get(self, key: str, default=None):
+        _, cache_key = normalize_key(key)
+        with self._lock:
+            row = self._db.execute('SELECT value FROM responses WHERE key = ?', (cache_key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._db.execute('UPDATE responses SET last_used = ? WHERE key = ?', (time.time(), cache_key))
+        return pickle.loads(zlib.decompress(row[0]))
+
+    def set(self, key: str, value) -> None:
+        model, cache_key = normalize_key(key)
+        try:
+            blob = zlib.compress(pickle.dumps(value), 9)
+        except Exception as e:
+            print(f"Response not cached: {str(e)}")
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                (cache_key, model, blob, len(blob), now, now)
+            )
+            self._evict()
+
+    def _evict(self):
+        # drop expired entries, then the least recently used ones until the cache fits
+        cursor = self._db.execute('DELETE FROM responses WHERE created < ?', (time.time() - self.max_age,))
+        self.evictions += max(0, cursor.rowcount)
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for cache_key, size in self._db.execute('SELECT key, size FROM responses ORDER BY last_used').fetchall():
+            self._db.execute('DELETE FROM responses WHERE key = ?', (cache_key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': entries, 'bytes': size}
+
+    def flush(self) -> None:
+        with self._lock:
+            self._db.commit()
+
+    def close(self) -> None:
+        """Commit, reclaim the space of evicted entries and close the file."""
+        with self._lock:
+            self._db.commit()
+            if self.evictions:
+                self._db.execute('VACUUM')
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # autogen enters and exits the cache around every request, so only commit here
+        self.flush()
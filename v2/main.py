@@ -1,8 +1,7 @@
 from dotenv import load_dotenv
-from autogen import UserProxyAgent, AssistantAgent
-from gnews import GNews
-from twikit import Client
+import functools
 import os
+import time
 
 
 # Load environment variables
@@ -17,6 +16,39 @@ GROQ_API_BASE = os.getenv("GROQ_API_BASE")
 RELEASE = os.getenv("RELEASE")
 AUTO_GENERATE_KEYWORDS = os.getenv("AUTO_GENERATE_KEYWORDS")
 VERSION = os.getenv("VERSION")
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", 8))  # concurrent article downloads
+FETCH_PER_DOMAIN = int(os.getenv("FETCH_PER_DOMAIN", 2))  # concurrent downloads per publisher host
+FETCH_TIMEOUT = int(os.getenv("FETCH_TIMEOUT", 10))  # seconds per article request
+HTTP_PER_HOST = int(os.getenv("HTTP_PER_HOST", 8))  # pooled keep-alive connections per host, shared by feeds, pages and the shortener
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 2))  # retries of a GET on connection errors, 429 and 5xx
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", os.cpu_count() or 1))  # processes parsing article html, 0 to parse in a thread
+FEED_WORKERS = int(os.getenv("FEED_WORKERS", 8))  # concurrent Google News queries
+FEED_RATE = float(os.getenv("FEED_RATE", 5))  # max Google News queries started per second
+SHORTENER_TIMEOUT = float(os.getenv("SHORTENER_TIMEOUT", 3))  # seconds per tinyurl request
+SHORTENER_DEADLINE = float(os.getenv("SHORTENER_DEADLINE", 15))  # seconds to wait for a batch of short urls
+NEAR_DUPLICATE_DISTANCE = int(os.getenv("NEAR_DUPLICATE_DISTANCE", 3))  # max simhash bit difference for the same story
+PROMPT_RESERVED_TOKENS = int(os.getenv("PROMPT_RESERVED_TOKENS", 2048))  # context left for instructions, tools and the reply
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", 0))  # optional cap on news tokens per prompt, 0 for none
+PROMPT_MIN_ARTICLE_TOKENS = int(os.getenv("PROMPT_MIN_ARTICLE_TOKENS", 64))  # smallest content share worth sending
+PROMPT_MAX_ARTICLE_TOKENS = int(os.getenv("PROMPT_MAX_ARTICLE_TOKENS", 200))  # extractive summary length per article, 0 for no cap
+FETCH_OVERSAMPLE = float(os.getenv("FETCH_OVERSAMPLE", 2))  # articles downloaded per prompt slot, to cover failures and duplicates
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", 5))  # size limit of the LLM response cache
+LLM_CACHE_MAX_AGE_DAYS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", 7))  # age limit of cached LLM responses
+LEDGER_TTL_DAYS = float(os.getenv("LEDGER_TTL_DAYS", 30))  # forget processed urls after this many days
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 8))  # articles per prompt, each batch is written and posted on its own
+STREAM_BATCH_WAIT = float(os.getenv("STREAM_BATCH_WAIT", 10))  # seconds before a partial batch is sent anyway
+MAX_RUN_ARTICLES = int(os.getenv("MAX_RUN_ARTICLES", 0))  # articles posted per run over all batches, 0 for as many as fit in one prompt
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", 16))  # items buffered between pipeline stages
+ARTICLE_CACHE_FRESH = float(os.getenv("ARTICLE_CACHE_FRESH", 3600))  # seconds a cached page is used without revalidating
+ARTICLE_CACHE_MAX_AGE_DAYS = float(os.getenv("ARTICLE_CACHE_MAX_AGE_DAYS", 7))  # drop cached pages not fetched for this long
+TOPIC_BUDGET = int(os.getenv("TOPIC_BUDGET", 30))  # topics from topics.csv queried per run, 0 for all
+TOPIC_EXPLORATION = float(os.getenv("TOPIC_EXPLORATION", 0.2))  # share of the topic budget picked at random instead of by yield
+TOPIC_MAX_BACKOFF_HOURS = float(os.getenv("TOPIC_MAX_BACKOFF_HOURS", 24))  # longest pause for a topic that keeps coming up empty
+PROFILES = os.getenv("PROFILES")  # JSON file of bot profiles to serve from this process, see v2/profiles.py
+FEED_CACHE_TTL = float(os.getenv("FEED_CACHE_TTL", 900))  # seconds a topic's feed is shared between profiles
+FEED_SEEN_HOURS = float(os.getenv("FEED_SEEN_HOURS", 24))  # hours a feed item is remembered as already taken
+WRITE_MODE = os.getenv("WRITE_MODE", "direct")  # 'direct' for one JSON completion per batch, 'agent' for the tweet writer agent chat
+HONOR_CANONICAL_LINK = os.getenv("HONOR_CANONICAL_LINK", "True") == "True"  # treat an article as its page's <link rel=canonical> url too
 
 if(RELEASE == "PROD"):
     USERNAME = os.getenv("XUSERNAME")
@@ -37,15 +69,23 @@ cache = '.cache'
 if not os.path.exists(cache):
     os.makedirs(cache)
 topics_file = f'{cache}/topics.csv'
-urls_file = f'{cache}/urls.csv'
+llm_cache_file = f'{cache}/llm_cache.db'
+short_urls_file = f'{cache}/short_urls.json'
+articles_file = f'{cache}/articles.db'  # downloaded pages, never committed (see .gitignore)
 
 #print current path and all the files
 print("Current path: ", os.getcwd())
 print("Files in the directory: ", os.listdir())
 
+from llm_cache import LLMCache
+from metrics import metrics
+
+# LLM responses are cached in llm_cache, passed to every chat below, instead of autogen's unbounded disk cache
+llm_cache = LLMCache(llm_cache_file, max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024), max_age_days=LLM_CACHE_MAX_AGE_DAYS)
+
 # Config dictionary
 llm_config = {
-    "cache_seed": 42,
+    "cache_seed": None,
     "config_list": [{
         "model": GROQ_MODEL_NAME,
         "api_key": GROQ_API_KEY,
@@ -53,27 +93,60 @@ llm_config = {
     }],
 }
 
-google_news = GNews()
-google_news.period = '1h'  # News from last 7 days
-google_news.max_results = int(ARTICLE_COUNT)  # number of responses across a keyword
-google_news.country = 'United States'  # News from a specific country 
-google_news.language = 'english'  # News in a specific language
+# Heavy clients are created on first use, so a run only pays for the components it needs
+@functools.lru_cache(None)
+def get_google_news(country=None):
+    import feedparser
+    from gnews import GNews
+    from gnews.utils.constants import BASE_URL, GOOGLE_NEWS_REGEX, USER_AGENT
+
+    class PooledGNews(GNews):
+        def _process(self, item):
+            # GNews sends a HEAD request per item to resolve Google News links; the encoded ones are decoded
+            # locally by decode_google_news_url, the others are resolved over the shared session
+            source = item.get('source', {}).get('href', '')
+            if any(re.match(f'^http(s)?://(www.)?{website.lower()}.*', source) for website in self._exclude_websites):
+                return None
+            url = item.get('link', '')
+            if re.match(GOOGLE_NEWS_REGEX, url) and not url.startswith(_ENCODED_URL_PREFIX):
+                url = http_client.head(url).headers.get('location', url)
+            return {
+                'guid': item.get('id') or item.get('link', ''),
+                'title': item.get('title', ''),
+                'description': self._clean(item.get('description', '')),
+                'published date': item.get('published', ''),
+                'url': url,
+                'publisher': item.get('source', ' '),
+            }
 
-# # Initialize client
-if RELEASE != 'DEV' and 'x_client' not in globals():
-    x_client = Client('en-US')
+        def poll(self, key, conditional_headers):
+            """As get_news, but over the shared session and with the validators `conditional_headers(url)` returns.
 
-    x_client.login(
-        auth_info_1=USERNAME,
-        auth_info_2=EMAIL,
-        password=PASSWORD
-    )
-    print("Client initialized")
+            Returns `(feed url, etag, last modified, items)`, items is None when the feed is unchanged.
+            """
+            url = BASE_URL + '/search?q={}'.format('%20'.join(key.split(' '))) + self._ceid()
+            response = http_client.get(url, headers={'User-Agent': USER_AGENT, **conditional_headers(url)}, proxies=self._proxy or None)
+            response.raise_for_status()
+            if response.status_code == 304:
+                return url, None, None, None
+            entries = feedparser.parse(response.content).entries[:self._max_results]
+            return url, response.headers.get('ETag'), response.headers.get('Last-Modified'), [item for item in map(self._process, entries) if item]
+
+    google_news = PooledGNews()
+    google_news.period = '1h'  # News from last 7 days
+    google_news.max_results = int(ARTICLE_COUNT)  # number of responses across a keyword
+    google_news.country = country or 'United States'  # News from a specific country 
+    google_news.language = 'english'  # News in a specific language
+    return google_news
+
+
+def get_x_client():
+    # restores the saved session or logs in on first use, so DEV runs never touch X
+    return profile.x_session.get_client()
 
 
 """Decode encoded Google News entry URLs."""
 import base64
-import functools
 import re
 
 
@@ -99,131 +172,329 @@ def decode_google_news_url(url: str) -> str:  # Not cached because not all Googl
     return _decode_google_news_url(url) if url.startswith(_ENCODED_URL_PREFIX) else url
 
 
-def deduplicate_news_list(urls, keywords):
-    # deduplicate the urls and keywords based on urls
-    urls_dict = {}
-    for i in range(len(urls)):
-        if urls[i] not in urls_dict:
-            urls_dict[urls[i]] = keywords[i]
-        else:
-            urls_dict[urls[i]] = urls_dict[urls[i]] + ', ' + keywords[i]
-
-    urls = list(urls_dict.keys())
-    keywords = list(urls_dict.values())
-    return urls, keywords
-
-
-from pyshorteners import Shortener
-from newspaper import Article
 from typing import Annotated
-import pandas as pd
+import threading
+from fetcher import DomainLimiter, RateLimiter
+from ledger import UrlLedger
+from shortener import ShortUrlService
+from dedupe import NearDuplicateFilter
+from canonical import canonicalize_url, canonical_link
+from prompt import prompt_budget, max_articles, pack_articles
+from extract import summarize_articles
+from stream import Channel, spawn, batched
+from article_cache import ArticleCache
+from topics import TopicScheduler
+from parse import ParsePool, ArticleRecord, trim_text
+from http_client import HttpClient
+from feeds import FeedPoller
+
+http_client = HttpClient(timeout=FETCH_TIMEOUT, per_host=HTTP_PER_HOST, retries=HTTP_RETRIES)
+short_url_service = ShortUrlService(short_urls_file, timeout=SHORTENER_TIMEOUT, deadline=SHORTENER_DEADLINE, http=http_client)
+article_cache = ArticleCache(articles_file, fresh_seconds=ARTICLE_CACHE_FRESH, max_age_days=ARTICLE_CACHE_MAX_AGE_DAYS)
+parse_pool = ParsePool(PARSE_WORKERS)
+
+
+# # Initialize the bot profiles
+from session import XSession
+from profiles import Profile, load_profiles
+
+
+def make_profile(name, keyword, country, topics, username, email, password):
+    # the only profile without PROFILES keeps its state directly in the cache directory, as before profiles existed
+    profile_cache = cache if PROFILES is None else f'{cache}/profiles/{name}'
+    os.makedirs(profile_cache, exist_ok=True)
+    repo_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    url_ledger = UrlLedger(f'{profile_cache}/urls.csv', ttl_days=LEDGER_TTL_DAYS)
+    # urls recorded before canonicalization, or with older rules, move to their canonical key
+    rekeyed = url_ledger.rekey(canonicalize_url)
+    if rekeyed:
+        print(f"Re-keyed {rekeyed} urls of {url_ledger.path} to their canonical form")
+    return Profile(
+        name, keyword, country, os.path.join(repo_dir, topics or 'topics.csv'), profile_cache,
+        url_ledger=url_ledger,
+        x_session=XSession(f'{profile_cache}/x_session_{username}.json', username, email, password),  # login cookies, never committed (see .gitignore)
+        feed_poller=FeedPoller(f'{profile_cache}/feeds.json', max_age_hours=FEED_SEEN_HOURS),
+        topic_scheduler=TopicScheduler(f'{profile_cache}/topic_stats.json', budget=TOPIC_BUDGET, exploration=TOPIC_EXPLORATION, max_backoff_hours=TOPIC_MAX_BACKOFF_HOURS),
+    )
 
 
-def read_news_articles_tool(urls, keywords):
-    if not os.path.isfile(urls_file):
-        df_urls = pd.DataFrame(columns=['urls', 'status'])  # Define the variable with a default value
-        df_urls.to_csv(urls_file)
-        print("File created")
+if PROFILES:
+    profiles = [make_profile(**config) for config in load_profiles(PROFILES, os.getenv)]
+else:
+    profiles = [make_profile('default', KEYWORD, None, None, USERNAME, EMAIL, PASSWORD)]
+profile = profiles[0]  # the profile being served, run() switches between them
+
+
+def download_page(article, page, url):
+    # fetch article.url, sending the validators of the cached copy so an unchanged page costs a 304; the page is cached under `url`
+    from newspaper import network
+
+    config = article.config
+    headers = dict(config.headers or {'User-Agent': config.browser_user_agent}, **ArticleCache.conditional_headers(page))
+    try:
+        with metrics.timer('article_download'):
+            response = http_client.get(article.url, **network.get_request_kwargs(config.request_timeout, config.browser_user_agent, config.proxies, headers))
+            response.raise_for_status()
+    except Exception as e:
+        article_cache.record_failure(url, str(e))
+        raise
+    etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+    if response.status_code == 304 and page is not None:
+        metrics.inc('article_cache_total', result='not_modified')
+        return article_cache.touch(url, etag, last_modified)
+
+    # decode the body the way newspaper does, then cache the page
+    article.download(input_html=network.get_html_2XX_only(article.url, config, response=response))
+    page = article_cache.store(url, article.html, etag, last_modified)
+    metrics.inc('article_cache_total', result='unchanged' if page.text is not None else 'downloaded')
+    return page
+
+
+def fetch_page(url, link):
+    # `url` is the canonical url the cache is keyed by, `link` the url from the feed that gets downloaded
+    from newspaper import Article
+
+    error = article_cache.recent_failure(url)
+    if error is not None:
+        metrics.inc('article_cache_total', result='failed_recently')
+        raise Exception(f"Failed within the last hour: {error}")
+
+    page = article_cache.get(url)
+    if page is not None and article_cache.is_fresh(page):
+        metrics.inc('article_cache_total', result='fresh')
+        return page
+    return download_page(Article(link, request_timeout=FETCH_TIMEOUT), page, url)
+
+
+def parse_page(url, link, page):
+    if page.text is None:
+        # only the html goes to the parse workers, only the fields used here come back
+        with metrics.timer('article_parse'):
+            title, text, publish_date = parse_pool.parse(link, page.html)
+        article_cache.store_parse(url, title, text, publish_date)
     else:
-        df_urls = pd.read_csv(urls_file, index_col='Unnamed: 0')
-        print("File loaded")
-    
-    urls = [url for url in urls if url not in df_urls['urls'].values]
-    
-    #deduplicate the urls and keywords based on urls
-    urls, keywords = deduplicate_news_list(urls, keywords)
-
-    if len(urls) == 0:
-        return []
-
-    article_list = []
-    for i in range(len(urls)):
+        # reuse the stored parse of an unchanged page
+        title, text, publish_date = page.title, page.text, page.publish_date
+    # the page and its html are dropped here, only the record travels on
+    canonical_url = canonical_link(page.html) if HONOR_CANONICAL_LINK else None
+    return ArticleRecord(link, title, trim_text(text), publish_date, canonical_url=canonical_url or url)
+
+
+feed_cache = {}  # (keyword, country) -> (ts, feed url, etag, last modified, sources), shared by the profiles of this process
+feed_cache_lock = threading.Lock()
+
+
+def fetch_feed(keyword, country=None, poller=None):
+    """Return the items of a topic's feed that `poller` hasn't seen, each with its `feed` url, or None when the fetch failed.
+
+    A full response is shared by the profiles for FEED_CACHE_TTL seconds and
+    every profile filters it with its own poller; requests are conditional
+    on the validators of the poller that sends them.
+    """
+    poller = poller or profile.feed_poller
+    with feed_cache_lock:
+        cached = feed_cache.get((keyword, country))
+    if cached is not None and time.time() - cached[0] < FEED_CACHE_TTL:
+        metrics.inc('feed_cache_hits_total')
+        _, url, etag, last_modified, sources = cached
+    else:
+        print(f"FETCHING NEWS ON TOPIC: {keyword}")
         try:
-            
-            article = Article(urls[i])
-            article.download()
-            article.parse()
-
-            if article.text: # and len(article.text.strip().split('\n')) > 1:
-                # Append the URL and status to the DataFrame
-                df_urls = pd.concat([pd.DataFrame([[urls[i], 'success']], columns=df_urls.columns), df_urls], ignore_index=True)
-                df_urls.to_csv(urls_file)
-                article.keyword = keywords[i]
-                article_list.append(article)
+            with metrics.timer('feed_fetch'):
+                url, etag, last_modified, sources = get_google_news(country).poll(keyword, poller.conditional_headers)
+        except Exception as e:
+            print(f"Error fetching news feed: {str(e)}")
+            metrics.inc('feed_polls_total', result='error')
+            return None
+        if sources is None:
+            metrics.inc('feed_polls_total', result='not_modified')
+            return []
+        metrics.inc('feed_polls_total', result='modified')
+        metrics.inc('feed_entries_total', len(sources))
+        with feed_cache_lock:
+            feed_cache[(keyword, country)] = (time.time(), url, etag, last_modified, sources)
+    new = poller.received(url, etag, last_modified, [source['guid'] for source in sources])
+    metrics.inc('feed_items_total', len(sources) - len(new), result='seen')
+    return [dict(source, feed=url) for source in sources if source['guid'] in new]
+
+
+def run_article_limit(budget=None):
+    # without MAX_RUN_ARTICLES a run posts what a single prompt could hold, as before the batches were streamed
+    if MAX_RUN_ARTICLES > 0:
+        return MAX_RUN_ARTICLES
+    if budget is None:
+        budget = prompt_budget(GROQ_MODEL_NAME, reserved_tokens=PROMPT_RESERVED_TOKENS, max_tokens=PROMPT_MAX_TOKENS)
+    return max_articles(budget, PROMPT_MIN_ARTICLE_TOKENS)
+
+
+def stream_news_batches(keyword_list, batch_size=STREAM_BATCH_SIZE, max_wait=STREAM_BATCH_WAIT, scheduler=None):
+    """Yield a packed prompt per batch of parsed articles, while later feeds and articles are still downloading.
+
+    Feeds, article downloads and the batches run as stages joined by bounded
+    queues. With no `batch_size` and `max_wait` all articles go into one prompt.
+    The yield of every queried keyword is recorded in `scheduler` when given.
+    At most `run_article_limit()` articles are sent over all batches.
+    """
+    budget = prompt_budget(GROQ_MODEL_NAME, reserved_tokens=PROMPT_RESERVED_TOKENS, max_tokens=PROMPT_MAX_TOKENS)
+    # the articles this run may send over all its batches, and the downloads queued for them
+    run_limit = run_article_limit(budget)
+    limit = int(run_limit * FETCH_OVERSAMPLE)
+
+    # run() rebinds the global profile while this run's stage threads may still be winding down
+    ledger, poller, country = profile.url_ledger, profile.feed_poller, profile.country
+    keywords = iter(keyword_list)
+    url_keywords = {}  # url -> keywords it was found for, also the set of urls already queued
+    lock = threading.Lock()
+    feed_limiter = RateLimiter(FEED_RATE)
+    domain_limiter = DomainLimiter(FETCH_PER_DOMAIN)
+    url_channel = Channel(STREAM_QUEUE_SIZE, producers=max(1, FEED_WORKERS))
+    page_channel = Channel(STREAM_QUEUE_SIZE, producers=max(1, FETCH_WORKERS))
+    article_channel = Channel(STREAM_QUEUE_SIZE, producers=max(1, PARSE_WORKERS))
+
+    def feed_worker():
+        while not url_channel.cancelled.is_set():
+            with lock:
+                keyword = next(keywords, None)
+                if keyword is None or len(url_keywords) >= limit:
+                    return
+            feed_limiter.wait()
+            sources = fetch_feed(keyword, country, poller)
+            if sources is None:
+                continue  # a failed fetch says nothing about the topic's yield
+            if scheduler is not None:
+                scheduler.queried(keyword)
+            for source in sources:
+                queued = False
+                try:
+                    with metrics.timer('url_decode'):
+                        decoded = decode_google_news_url(source['url'])
+                        url = canonicalize_url(decoded)
+                except Exception as e:
+                    # a link format the decoder doesn't know, skipped for good rather than refetching the feed for it
+                    print(f"Error decoding url {source['url']}: {str(e)}")
+                    metrics.inc('url_decode_errors_total')
+                    poller.seen(source['feed'], source['guid'])
+                    continue
+                if url != decoded:
+                    metrics.inc('urls_canonicalized_total')
+                with lock:
+                    if url in url_keywords:
+                        url_keywords[url].append(keyword)
+                    elif url not in ledger and len(url_keywords) >= limit:
+                        continue  # left unseen, so the next run gets it from the feed again
+                    elif url not in ledger:
+                        url_keywords[url] = [keyword]
+                        queued = True
+                if queued and not url_channel.put((url, decoded)):
+                    return
+                poller.seen(source['feed'], source['guid'])
+
+    def download_worker():
+        for url, link in url_channel:
+            if page_channel.cancelled.is_set():
+                return
+            try:
+                with domain_limiter.slot(link):
+                    page = fetch_page(url, link)
+            except Exception as e:
+                print(f"Error reading article: {str(e)}")
+                metrics.inc('articles_total', status='error')
+                ledger.record(url, 'error')
                 continue
-            else:
-                df_urls = pd.concat([pd.DataFrame([[urls[i], 'empty']], columns=df_urls.columns), df_urls], ignore_index=True)
-                df_urls.to_csv(urls_file)
+            if not page_channel.put((url, link, page)):
+                return
+
+    def parse_worker():
+        # each thread keeps one parse process busy
+        for url, link, page in page_channel:
+            if article_channel.cancelled.is_set():
+                return
+            try:
+                article = parse_page(url, link, page)
+                status = 'success' if article.text else 'empty'
+            except Exception as e:
+                status = 'error'
+                print(f"Error parsing article: {str(e)}")
+            if status == 'success' and article.canonical_url != url:
+                # the page may name another url as its own, e.g. a syndicated copy or a variant the rules missed
+                declared = article.canonical_url
+                with lock:
+                    duplicate = declared in url_keywords or declared in ledger
+                    if not duplicate:
+                        url_keywords[declared] = url_keywords[url]
+                if duplicate:
+                    status = 'duplicate'
+                else:
+                    ledger.record(declared, status)
+            metrics.inc('articles_total', status=status)
+            ledger.record(url, status)
+            if status == 'success':
+                with lock:
+                    article.keyword = ', '.join(url_keywords[url])
+                    if scheduler is not None:
+                        for keyword in url_keywords[url]:
+                            scheduler.credit(keyword)
+                if not article_channel.put(article):
+                    return
+
+    # fork the parse processes before this run's threads start
+    parse_pool.start()
+    spawn(feed_worker, max(1, FEED_WORKERS), url_channel, 'feed')
+    spawn(download_worker, max(1, FETCH_WORKERS), page_channel, 'download')
+    spawn(parse_worker, max(1, PARSE_WORKERS), article_channel, 'parse')
+    # the same story syndicated across outlets is only sent once, also across batches
+    duplicates = NearDuplicateFilter(NEAR_DUPLICATE_DISTANCE)
+    sent = 0
+    try:
+        for article_list in batched(article_channel, batch_size, max_wait):
+            count = len(article_list)
+            article_list = duplicates.filter(article_list)[:run_limit - sent]
+            print(f"Articles read: {count}, after near-duplicate removal: {len(article_list)}")
+            if len(article_list) == 0:
                 continue
-        except Exception as e:
-            df_urls = pd.concat([pd.DataFrame([[urls[i], 'error']], columns=df_urls.columns), df_urls], ignore_index=True)
-            df_urls.to_csv(urls_file)
-            print(f"Error reading article: {str(e)}")
-            continue
 
-    return article_list
+            # Get the short urls
+            with metrics.timer('shorten_batch'):
+                short_urls = short_url_service.shorten_many([article.url for article in article_list])
+            for article, short_url in zip(article_list, short_urls):
+                article.short_url = short_url
+
+            packed = pack_articles(article_list, budget, min_content_tokens=PROMPT_MIN_ARTICLE_TOKENS, max_content_tokens=PROMPT_MAX_ARTICLE_TOKENS, summarize=summarize_articles)
+            print(f"Packed {packed.packed} articles in {packed.tokens}/{budget} tokens, dropped {packed.dropped}")
+            metrics.inc('prompt_articles_total', packed.packed, result='packed')
+            metrics.inc('prompt_articles_total', packed.dropped, result='dropped')
+            sent += packed.packed
+            yield packed.text
+            if sent >= run_limit:
+                print(f"Run limit of {run_limit} articles reached")
+                return
+    finally:
+        # stop the stages when the consumer stops early
+        url_channel.cancel()
+        page_channel.cancel()
+        article_channel.cancel()
+        ledger.flush()
+        print(f"Ledger compacted, {ledger.compact()} expired rows removed")
+        if scheduler is not None:
+            scheduler.commit()
+        poller.commit()
 
 
 def get_news_articles_tool(keyword_list: Annotated[list, "The list of keywords"], count: Annotated[int, "The number of news articles to collect from the internet"]) -> str:
-    s = Shortener(timeout=5)
-    
-    urls, keywords = [], []
-    for keyword in keyword_list:
-        # keyword = keyword.replace(" ", "%20")
-        print(f"FETCHING NEWS ON TOPIC: {keyword}")
-        sources = google_news.get_news(keyword)
-        # source.build(keyword = keyword, topic = 'TECHNOLOGY', top_news=False)
-        for source in sources:
-            decoded_url = decode_google_news_url(source['url'])
-            urls = urls + [decoded_url]
-        keywords = keywords + [keyword] * len(sources)
-    print(f"URLS: {urls}")
-        
-    if len(urls) == 0:
-        return None
-    
-    article_list = read_news_articles_tool(urls, keywords)
-    print(f"Articles read: {len(article_list)}")
-
-    result = ''
-    if len(article_list) > 0:
-        # Get the short urls
-        for article in article_list:
-            try:
-                article.short_url = s.tinyurl.short(article.url)
-            except Exception as e:
-                print(f"Error shortening url: {str(e)}")
-                article.short_url = article.url
-
-        for i in range(len(article_list)):
-            # do this until the result length is less than 30000
-            if len(result) > 30000:
-                break
-            result += ("""NEWS {n} TOPIC: {keyword}
-NEWS {n} TITLE: {title}
-NEWS {n} CONTENT: {content}
-NEWS {n} SOURCE: {url}
-
-"""
-        ).format(
-            keyword = article_list[i].keyword,
-            n = i+1,
-            title=article_list[i].title,
-            content=article_list[i].text.replace('\n\n', '\n')[:1000],
-            url=article_list[i].short_url
-        )
-
-    return result[:4500]
-
-# read and print urls_file
-if os.path.isfile(urls_file):
-    print("File found at: ", urls_file)
-else:
-    print("File not found")
+    # the agent gets every article in a single prompt
+    for news_articles in stream_news_batches(keyword_list, batch_size=None, max_wait=None):
+        return news_articles
+    return ''
+
+# read and print the urls file of every profile
+for served in profiles:
+    if os.path.isfile(served.url_ledger.path):
+        print("File found at: ", served.url_ledger.path)
+    else:
+        print("File not found")
 
 import re
 from datetime import datetime
-import pytz
 
 
 def merge_tweets(tweet_list: Annotated[list, "The list of tweets to merge"]) -> None:
@@ -260,6 +531,8 @@ def add_source_urls(tweet_list: Annotated[list, "The list of tweets to post"], s
     return tweet_list
 
 def get_intro_tweet() -> str:
+    import pytz
+
     now = datetime.now(pytz.utc)
     eastern = pytz.timezone('America/New_York')
     now_eastern = now.astimezone(eastern)
@@ -272,7 +545,15 @@ def get_intro_tweet() -> str:
 {formatted_datetime}"""
 
 
-import time
+from publisher import ThreadPublisher
+from summarize import tweet_messages, parse_tweets, news_sources, SchemaError
+
+
+def post_tweet(text, reply_to):
+    if RELEASE == "DEV":
+        return None
+    with metrics.timer('tweet_post'):
+        return get_x_client().create_tweet(text=text, reply_to=reply_to)
 
 
 def write_tweet_tool(tweet_list: Annotated[list, "The list of tweets to post"], source_list: Annotated[list, "The list of 'https://tinyurl.com/' source URL for each tweet"]) -> str:
@@ -280,44 +561,25 @@ def write_tweet_tool(tweet_list: Annotated[list, "The list of tweets to post"],
     # tweet_list = merge_tweets(tweet_list)
     # tweet_list = [get_intro_tweet()] + tweet_list
 
+    # final tweet length check for redundancy 
+    tweet_list = [tweet if len(tweet) <= 280 else tweet[:276] + '...' for tweet in tweet_list]
+
+    publisher = ThreadPublisher(post_tweet, on_unauthorized=profile.x_session.invalidate, reply_to=profile.last_tweet_id)
     posts = ''
-    # for tweet, source in zip(tweet_list, source_list):
-    for i in range(len(tweet_list)):
-    #     if 'https://tinyurl.com/' in tweet_list[i]:
-    #         if len(tweet_list[i]) > 280:
-    #             tweet_list[i] = tweet_list[i][:276-len(source)] + '...' + f"\n{source}"
-    #     else:
-    #         if len(tweet_list[i]) <= 279-len(source):
-    #             tweet_list[i] += f"\n{source}"
-    #         else:
-    #             tweet_list[i] = tweet_list[i][:276-len(source)] + '...' + f"\n{source}"
-        try:
-            # final tweet length check for redundancy 
-            if len(tweet_list[i]) > 280:
-                tweet_list[i] = tweet_list[i][:276] + '...'
-
-            if RELEASE != "DEV":
-                if i==0:
-                    last_tweet = x_client.create_tweet(
-                        text=tweet_list[i],
-                    )
-                else:
-                    last_tweet = x_client.create_tweet(
-                        text=tweet_list[i],
-                        reply_to=last_tweet.id
-                    )
-            
-            posts += ("""
+    for result in publisher.publish(tweet_list):
+        metrics.inc('tweets_total', status='failed' if result.error is not None else 'posted')
+        metrics.inc('tweet_attempts_total', result.attempts)
+        if result.error is not None:
+            print(f"Failed to post tweet: {str(result.error)}")
+            continue
+        print(f"Tweet posted in {result.seconds:.2f}s after {result.attempts} attempt(s)")
+        posts += ("""
 Tweet: {tweet}
 Length: {length}
                       
-                      """).format(tweet=tweet_list[i], length=len(tweet_list[i]))
-            
-            time.sleep(1)
-        except Exception as e:
-            error_message = f"Failed to post tweet: {str(e)}"
-            print(error_message)
-            continue
+                      """).format(tweet=result.text, length=len(result.text))
+
+    profile.last_tweet_id = publisher.reply_to
 
     if(posts == ''):
         posts = "No tweets posted"
@@ -325,93 +587,212 @@ Length: {length}
     return posts
 
 
-news_collector_agent = AssistantAgent(
-    "news_collector_agent",
-    llm_config=llm_config,
-    system_message=f"""You are good at collecting recent news articles about a given keyword on the internet. 
+def instrument_llm(client, name):
+    # time every completion request of the client and count its tokens, split by LLM cache hit or miss
+    create = client.create
+
+    def create_with_metrics(**config):
+        hits, start = llm_cache.hits, time.perf_counter()
+        response = create(**config)
+        labels = {'agent': name, 'cache': 'hit' if llm_cache.hits > hits else 'miss'}
+        metrics.observe('llm_call_seconds', time.perf_counter() - start, **labels)
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            metrics.inc('llm_prompt_tokens_total', usage.prompt_tokens or 0, **labels)
+            metrics.inc('llm_completion_tokens_total', usage.completion_tokens or 0, **labels)
+        return response
+
+    client.create = create_with_metrics
+    return client
+
+
+@functools.lru_cache(None)
+def get_user_proxy_agent():
+    from autogen import UserProxyAgent
+
+    return UserProxyAgent(
+        name="User",
+        system_message="You are a helpful AI assistant. Return 'TERMINATE' when the task is done.",
+        is_termination_msg=lambda msg: msg.get("content") is not None and "TERMINATE" in msg["content"],
+        human_input_mode="NEVER",
+        code_execution_config=False,
+    )
+
+
+@functools.lru_cache(None)
+def get_news_collector_agent():
+    from autogen import AssistantAgent
+
+    news_collector_agent = AssistantAgent(
+        "news_collector_agent",
+        llm_config=llm_config,
+        system_message=f"""You are good at collecting recent news articles about a given keyword on the internet. 
     You should generate a list of {KEYWORD_COUNT} topics closely related to the given keyword. 
     Use the provided tool to collect news about the generated list of topics.""",
-    max_consecutive_auto_reply=1
-)
+        max_consecutive_auto_reply=1
+    )
+
+    # Register the tool signature with the assistant agent and the tool function with the user proxy agent.
+    news_collector_agent.register_for_llm(name="get_news_articles_tool", description="Collect news articles about a list of topics on the internet.")(get_news_articles_tool)
+    get_user_proxy_agent().register_for_execution(name="get_news_articles_tool")(get_news_articles_tool)
+    # after registering, since registering a tool replaces the agent's client
+    instrument_llm(news_collector_agent.client, news_collector_agent.name)
+    return news_collector_agent
 
-tweet_writer_agent = AssistantAgent(
-    "tweet_writer_agent",
-    llm_config=llm_config,
-    system_message=f"""You are an autonomous twitter bot that's created to educate the people about {KEYWORD}. 
+
+@functools.lru_cache(None)
+def get_tweet_writer_agent(keyword):
+    from autogen import AssistantAgent
+
+    tweet_writer_agent = AssistantAgent(
+        "tweet_writer_agent",
+        llm_config=llm_config,
+        system_message=f"""You are an autonomous twitter bot that's created to educate the people about {keyword}. 
     You are good at posting a series of twitter posts on the given list of news by summarizing each news as one short tweet. 
-    You MUST only strictly post news that is about the topic {KEYWORD} or the respective news topic given and ignore other news(double check this). 
+    You MUST only strictly post news that is about the topic {keyword} or the respective news topic given and ignore other news(double check this). 
     Always use simple words. 
     Use the provided tool to post all the tweets as a thread(list of tweets).""",
-    max_consecutive_auto_reply=1
-)
-
-
-user_proxy_agent = UserProxyAgent(
-    name="User",
-    system_message="You are a helpful AI assistant. Return 'TERMINATE' when the task is done.",
-    is_termination_msg=lambda msg: msg.get("content") is not None and "TERMINATE" in msg["content"],
-    human_input_mode="NEVER",
-    code_execution_config=False,
-)
-
-
-# # Register the tool signature with the assistant agent.
-news_collector_agent.register_for_llm(name="get_news_articles_tool", description="Collect news articles about a list of topics on the internet.")(get_news_articles_tool)
-tweet_writer_agent.register_for_llm(name="write_tweet_tool", description="Write a twitter thread.")(write_tweet_tool)
-
-# Register the tool function with the user proxy agent.
-user_proxy_agent.register_for_execution(name="get_news_articles_tool")(get_news_articles_tool)
-user_proxy_agent.register_for_execution(name="write_tweet_tool")(write_tweet_tool)
-
-
-import random
-
-
-try:
-    if AUTO_GENERATE_KEYWORDS=='True':
-        user_proxy_agent.initiate_chats([
-            {
-                "recipient": news_collector_agent,
-                "message": f"Collect {KEYWORD_COUNT} news articles about the topic '{KEYWORD}' from the internet.",
-                "clear_history": True,
-                "silent": False,
-                "summary_method": "last_msg"
-            },
-            {
-                "recipient": tweet_writer_agent,
-                "message": "Write and post a twitter thread about the given list of news articles:\n",
-                "clear_history": True,
-                "silent": False,
-                "summary_method": "last_msg"
-            }
-        ])
-    else:
-        topics_list = pd.read_csv('../topics.csv')
-        topics_list = topics_list.values.tolist()
-        topics_list = [item for sublist in topics_list for item in sublist]
-        topics_list = [x for x in topics_list if str(x) != 'nan']
-        random.shuffle(topics_list)
-        # topics_list = topics_list[:5] # TESTING
-
-        if len(topics_list)==0:
-            raise Exception("No topics found")
-
-        news_articles = get_news_articles_tool(keyword_list=topics_list, count=int(ARTICLE_COUNT))
-        if news_articles:
-            user_proxy_agent.initiate_chats([
+        max_consecutive_auto_reply=1
+    )
+
+    # Register the tool signature with the assistant agent and the tool function with the user proxy agent.
+    tweet_writer_agent.register_for_llm(name="write_tweet_tool", description="Write a twitter thread.")(write_tweet_tool)
+    get_user_proxy_agent().register_for_execution(name="write_tweet_tool")(write_tweet_tool)
+    # after registering, since registering a tool replaces the agent's client
+    instrument_llm(tweet_writer_agent.client, tweet_writer_agent.name)
+    return tweet_writer_agent
+
+
+@functools.lru_cache(None)
+def get_llm_client():
+    from autogen import OpenAIWrapper
+
+    return instrument_llm(OpenAIWrapper(**llm_config), 'direct')
+
+
+def write_tweets_direct(news_articles):
+    # one structured completion for the whole batch; returns None when the reply is unusable
+    messages = tweet_messages(profile.keyword, news_articles)
+    try:
+        response = get_llm_client().create(messages=messages, response_format={"type": "json_object"}, cache=llm_cache)
+        tweet_list, source_list = parse_tweets(response.choices[0].message.content, news_sources(news_articles))
+    except Exception as e:
+        print(f"Direct tweet writing failed, falling back to the agent: {str(e)}")
+        metrics.inc('direct_writes_total', result='invalid' if isinstance(e, SchemaError) else 'error')
+        return None
+    metrics.inc('direct_writes_total', result='valid')
+    posts = write_tweet_tool(tweet_list, source_list)
+    print(posts)
+    return posts
+
+
+def write_batch(news_articles):
+    if WRITE_MODE == 'direct' and write_tweets_direct(news_articles) is not None:
+        return
+    get_user_proxy_agent().initiate_chats([
+        {
+            "recipient": get_tweet_writer_agent(profile.keyword),
+            "message": f"Write and post a twitter thread about the given list of news articles:\n{news_articles}",
+            "clear_history": True,
+            "silent": False,
+            "summary_method": "last_msg",
+            "cache": llm_cache
+        }
+    ])
+
+
+def run_profile():
+    # one pass of the pipeline for the current profile
+    since, started, status = metrics.snapshot(), time.time(), 'error'
+    run_report_file = f'{profile.cache_dir}/run_report.json'
+    profile.last_tweet_id = None
+    try:
+        if AUTO_GENERATE_KEYWORDS=='True':
+            get_user_proxy_agent().initiate_chats([
                 {
-                    "recipient": tweet_writer_agent,
-                    "message": f"Write and post a twitter thread about the given list of news articles:\n{news_articles}",
+                    "recipient": get_news_collector_agent(),
+                    "message": f"Collect {KEYWORD_COUNT} news articles about the topic '{profile.keyword}' from the internet.",
                     "clear_history": True,
                     "silent": False,
-                    "summary_method": "last_msg"
+                    "summary_method": "last_msg",
+                    "cache": llm_cache
+                },
+                {
+                    "recipient": get_tweet_writer_agent(profile.keyword),
+                    "message": "Write and post a twitter thread about the given list of news articles:\n",
+                    "clear_history": True,
+                    "silent": False,
+                    "summary_method": "last_msg",
+                    "cache": llm_cache
                 }
             ])
         else:
-            raise Exception("No news articles found")
-except Exception as e:
-    print(f"Global Error: {str(e)}")
-    #print trackback
-    import traceback
-    traceback.print_exc()
-    raise e
\ No newline at end of file
+            import pandas as pd
+
+            topics_list = pd.read_csv(profile.topics_file)
+            topics_list = topics_list.values.tolist()
+            topics_list = [item for sublist in topics_list for item in sublist]
+            topics_list = [x for x in topics_list if str(x) != 'nan']
+            # topics_list = topics_list[:5] # TESTING
+
+            topics_list = profile.topic_scheduler.select(topics_list)
+
+            if len(topics_list)==0:
+                raise Exception("No topics found")
+
+            # write and post each batch as soon as it is ready, while the later articles are still downloading
+            batches = 0
+            max_batches = -(-run_article_limit() // max(1, STREAM_BATCH_SIZE))  # each batch is its own thread
+            for news_articles in stream_news_batches(topics_list, scheduler=profile.topic_scheduler):
+                batches += 1
+                with metrics.timer('batch_write'):
+                    write_batch(news_articles)
+                if batches >= max_batches:
+                    break
+            if batches == 0:
+                raise Exception("No news articles found")
+        status = 'success'
+    except Exception as e:
+        print(f"Global Error: {str(e)}")
+        #print trackback
+        import traceback
+        traceback.print_exc()
+        raise e
+    finally:
+        print(f"LLM cache: {llm_cache.stats()}")
+        print(f"Article cache: {article_cache.stats()}")
+        print(f"HTTP connections: {http_client.stats()}")
+        if profile.x_session.metrics:
+            print(f"X session: {profile.x_session.metrics}")
+        llm_cache.flush()
+        metrics.inc('runs_total', status=status)
+        metrics.observe('run_seconds', time.time() - started)
+        metrics.write_report(run_report_file, since=since, started=datetime.fromtimestamp(started).isoformat(timespec='seconds'),
+                             seconds=round(time.time() - started, 2), status=status, llm_cache=llm_cache.stats(),
+                             profile=profile.name, x_session=profile.x_session.metrics, http=http_client.stats())
+        print(f"Run report written to {run_report_file}")
+
+
+def run():
+    # serve every profile in turn; module level state (caches, clients, agents) is reused across profiles and calls,
+    # so a topic or article shared by several profiles is only fetched and parsed once
+    global profile
+    errors = []
+    for profile in profiles:
+        if len(profiles) > 1:
+            print(f"PROFILE: {profile.name}")
+        try:
+            run_profile()
+        except Exception as e:
+            errors.append(e)
+    if errors:
+        raise errors[0]
+
+
+if __name__ == '__main__':
+    try:
+        run()
+    finally:
+        llm_cache.close()
+        article_cache.close()
+        parse_pool.close()
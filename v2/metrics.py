@@ -0,0 +1,142 @@
+"""Counters and latency histograms for the news-to-tweet pipeline.
+
+`metrics` is the process-wide registry. Values are cumulative for the life
+of the process, which is what the Prometheus endpoint of the daemon mode
+exposes; a run report is the difference against a snapshot taken when the
+run started.
+"""
+import copy
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+def _format(name: str, labels: tuple, extra: dict = None) -> str:
+    pairs = list(labels) + sorted((extra or {}).items())
+    if not pairs:
+        return name
+    return name + '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> {'buckets': [...], 'sum': s, 'count': n, 'max': m}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0, 'max': 0.0}
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+            histogram['max'] = max(histogram['max'], value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the duration of the block in the `{name}_seconds` histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(f'{name}_seconds', time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'counters': dict(self._counters), 'histograms': copy.deepcopy(self._histograms)}
+
+    def report(self, since: dict = None) -> dict:
+        """Counters and histogram summaries, minus the values in `since` when given."""
+        current = self.snapshot()
+        since = since or {'counters': {}, 'histograms': {}}
+        counters = {}
+        for key, value in current['counters'].items():
+            value -= since['counters'].get(key, 0)
+            if value:
+                counters[_format(*key)] = value
+        histograms = {}
+        for key, histogram in current['histograms'].items():
+            before = since['histograms'].get(key, {'sum': 0.0, 'count': 0})
+            count = histogram['count'] - before['count']
+            if count:
+                total = histogram['sum'] - before['sum']
+                histograms[_format(*key)] = {'count': count, 'sum': round(total, 4), 'mean': round(total / count, 4),
+                                             'max': round(histogram['max'], 4)}
+        return {'counters': counters, 'histograms': histograms}
+
+    def write_report(self, path: str, since: dict = None, **fields):
+        report = dict(fields, **self.report(since))
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def prometheus_text(self) -> str:
+        """Render the registry in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines, typed = [], set()
+        for (name, labels), value in sorted(snapshot['counters'].items()):
+            if name not in typed:
+                lines.append(f'# TYPE {name} counter')
+                typed.add(name)
+            lines.append(f'{_format(name, labels)} {value}')
+        for (name, labels), histogram in sorted(snapshot['histograms'].items()):
+            if name not in typed:
+                lines.append(f'# TYPE {name} histogram')
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{_format(name + "_bucket", labels, {"le": le})} {cumulative}')
+            lines.append(f'{_format(name + "_sum", labels)} {histogram["sum"]}')
+            lines.append(f'{_format(name + "_count", labels)} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port: int, host: str = '0.0.0.0'):
+        """Serve `/metrics` from a background thread and return the server."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                payload = registry.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Serving metrics on http://{host}:{port}/metrics")
+        return server
+
+
+metrics = Metrics()
@@ -0,0 +1,83 @@
+"""Article HTML parsing in worker processes.
+
+newspaper's parse (lxml plus its text extraction heuristics) is CPU-bound,
+so parsing on the download threads serializes on the GIL. `ParsePool` sends
+only the raw HTML to a pool of processes and gets back only the fields the
+pipeline uses, which end up in an `ArticleRecord` rather than a newspaper
+`Article` with its HTML, DOM and image fields. The workers are forked, not
+spawned: the pipeline scripts run at import, so a spawned worker would run
+them again. Call `start` before other threads are running, so no lock is
+held in the forked workers.
+"""
+import multiprocessing
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+MAX_TEXT_CHARS = 20000  # far more than any prompt share, the summaries only need the leading sentences
+
+_BLANK_LINES_RE = re.compile(r'\n\s*\n+')
+
+
+class ArticleRecord:
+    """The fields of an article the pipeline uses, and nothing else."""
+    __slots__ = ('url', 'canonical_url', 'title', 'text', 'keyword', 'short_url', 'publish_date')
+
+    def __init__(self, url: str, title: str, text: str, publish_date=None, canonical_url: str = None):
+        self.url = url
+        self.canonical_url = canonical_url or url  # the dedupe key: the page's <link rel=canonical>, or the canonical form of url
+        self.title = title
+        self.text = text
+        self.keyword = ''  # the topics it was found for, comma separated
+        self.short_url = url
+        self.publish_date = publish_date
+
+
+def trim_text(text: str, max_chars: int = MAX_TEXT_CHARS) -> str:
+    return _BLANK_LINES_RE.sub('\n', (text or '').strip())[:max_chars]
+
+
+def parse_html(url: str, html: str) -> tuple:
+    """Return `(title, text, publish_date)` of an article page, with the text trimmed."""
+    from newspaper import Article
+
+    article = Article(url)
+    article.download(input_html=html)
+    article.parse()
+    return article.title, trim_text(article.text), article.publish_date
+
+
+class ParsePool:
+    def __init__(self, workers: int):
+        self.workers = workers  # 0 to parse in the calling thread
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.workers <= 0 or self._executor is not None:
+                return
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'))
+            # with fork every worker is started on the first task, so start them now
+            self._executor.submit(int).result()
+
+    def parse(self, url: str, html: str) -> tuple:
+        executor = self._executor  # read once, another thread may drop it meanwhile
+        if executor is None:
+            return parse_html(url, html)
+        try:
+            return executor.submit(parse_html, url, html).result()
+        except BrokenProcessPool:
+            # a worker died (out of memory, killed): parse here from now on
+            with self._lock:
+                if self._executor is executor:
+                    print("Parse pool broken, parsing in threads")
+                    self._executor = None
+            return parse_html(url, html)
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,66 @@
+"""Bot profiles served by one process.
+
+A profile is one bot: a keyword, an optional news country, an X account and
+the topics it covers. Profiles share the feed, article, short url and LLM
+caches, and each keeps its own url ledger, feed poll state, X session, topic
+statistics and tweet thread in its own cache directory.
+
+PROFILES points to a JSON list such as
+
+    [{"name": "ai", "keyword": "AI", "username_env": "XUSERNAME", "email_env": "XEMAIL",
+      "password_env": "XPASSWORD"},
+     {"name": "robotics", "keyword": "Robotics", "country": "United Kingdom",
+      "topics": "robotics_topics.csv", "username_env": "XUSERNAME_ROBOTICS", ...}]
+
+Credentials are never written in the file; `*_env` names the environment
+variable that holds them.
+"""
+import json
+import re
+
+_NAME_RE = re.compile(r'^[a-z0-9_-]+$')
+
+
+class Profile:
+    def __init__(self, name: str, keyword: str, country: str, topics_file: str, cache_dir: str, url_ledger,
+                 x_session, topic_scheduler, feed_poller):
+        self.name = name
+        self.keyword = keyword
+        self.country = country  # None for the GNews default
+        self.topics_file = topics_file
+        self.cache_dir = cache_dir
+        self.url_ledger = url_ledger
+        self.x_session = x_session
+        self.topic_scheduler = topic_scheduler
+        self.feed_poller = feed_poller
+        self.last_tweet_id = None  # the batches of one run are posted as a single thread
+
+
+def load_profiles(path: str, getenv) -> list:
+    """Read the profile list at `path`, resolving credentials with `getenv`.
+
+    Returns a dict per profile with `name`, `keyword`, `country`, `topics`,
+    `username`, `email` and `password`.
+    """
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path} must hold a non-empty list of profiles")
+    profiles, names = [], set()
+    for entry in entries:
+        name = entry.get('name', '')
+        if not _NAME_RE.match(name) or name in names:
+            raise ValueError(f"Profile names must be unique and use only a-z, 0-9, '_' and '-': {name!r}")
+        if not entry.get('keyword'):
+            raise ValueError(f"Profile {name} has no keyword")
+        names.add(name)
+        profiles.append({
+            'name': name,
+            'keyword': entry['keyword'],
+            'country': entry.get('country'),
+            'topics': entry.get('topics'),
+            'username': getenv(entry.get('username_env', '')),
+            'email': getenv(entry.get('email_env', '')),
+            'password': getenv(entry.get('password_env', '')),
+        })
+    return profiles
@@ -0,0 +1,128 @@
+"""Token-budget-aware packing of news articles into the tweet writer prompt.
+
+Tokens are estimated locally (roughly one token per four characters of each
+word, one per punctuation mark), which tracks the Llama/Mixtral tokenizers
+closely enough for budgeting without a tokenizer dependency.
+"""
+import re
+from collections import namedtuple
+
+NEWS_TEMPLATE = """NEWS {n} TOPIC: {keyword}
+NEWS {n} TITLE: {title}
+NEWS {n} CONTENT: {content}
+NEWS {n} SOURCE: {url}
+
+"""
+
+# context windows of the Groq models we have used, in tokens
+MODEL_CONTEXT_TOKENS = {
+    'llama3-8b-8192': 8192,
+    'llama3-70b-8192': 8192,
+    'llama-3.1-8b-instant': 131072,
+    'llama-3.1-70b-versatile': 131072,
+    'mixtral-8x7b-32768': 32768,
+    'gemma-7b-it': 8192,
+    'gemma2-9b-it': 8192,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+HEADER_TOKENS_ESTIMATE = 48  # TOPIC, TITLE and SOURCE lines of a typical NEWS block
+
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+
+PackResult = namedtuple('PackResult', ['text', 'packed', 'dropped', 'tokens'])
+
+
+def count_tokens(text: str) -> int:
+    return sum(-(-len(token) // 4) for token in _TOKEN_RE.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` after the last whole word that fits in `max_tokens`."""
+    used, end = 0, 0
+    for match in _TOKEN_RE.finditer(text):
+        used += -(-len(match.group()) // 4)
+        if used > max_tokens:
+            break
+        end = match.end()
+    else:
+        return text
+    return text[:end]
+
+
+def context_limit(model_name: str) -> int:
+    if model_name in MODEL_CONTEXT_TOKENS:
+        return MODEL_CONTEXT_TOKENS[model_name]
+    # most Groq model names end with their context size, e.g. 'mixtral-8x7b-32768'
+    match = re.search(r'-(\d{4,6})$', model_name or '')
+    return int(match.group(1)) if match else DEFAULT_CONTEXT_TOKENS
+
+
+def prompt_budget(model_name: str, reserved_tokens: int = 2048, max_tokens: int = None) -> int:
+    """Tokens available for news, leaving `reserved_tokens` for instructions, tools and the reply."""
+    budget = context_limit(model_name) - reserved_tokens
+    if max_tokens:
+        budget = min(budget, max_tokens)
+    return max(0, budget)
+
+
+def max_articles(budget: int, min_content_tokens: int = 64) -> int:
+    """Upper bound on how many articles can ever fit in `budget`."""
+    return budget // (HEADER_TOKENS_ESTIMATE + min_content_tokens)
+
+
+def _fair_shares(needs: list, available: int) -> list:
+    # max-min fair split: short articles take what they need, the rest share the remainder equally
+    shares = [0] * len(needs)
+    left = len(needs)
+    for i in sorted(range(len(needs)), key=lambda i: needs[i]):
+        share = available // left
+        shares[i] = min(needs[i], share)
+        available -= shares[i]
+        left -= 1
+    return shares
+
+
+def pack_articles(articles: list, budget: int, min_content_tokens: int = 64, max_content_tokens: int = None,
+                  summarize=None) -> PackResult:
+    """Pack as many articles as fit into `budget` tokens, in order.
+
+    Every packed article gets a complete NEWS block with a fair share of the
+    content budget, capped at `max_content_tokens`; articles that cannot get
+    `min_content_tokens` of content are dropped whole rather than split.
+    `summarize(texts, shares)` shrinks the contents to their shares, by
+    default they are truncated.
+    """
+    contents = [article.text.replace('\n\n', '\n') for article in articles]
+    headers = [
+        count_tokens(NEWS_TEMPLATE.format(n=i + 1, keyword=article.keyword, title=article.title, content='', url=article.short_url))
+        for i, article in enumerate(articles)
+    ]
+
+    # admit articles in order while each can still get its minimum content share
+    packed, header_total, content_floor = 0, 0, 0
+    for i in range(len(articles)):
+        floor = min(min_content_tokens, count_tokens(contents[i]))
+        if header_total + headers[i] + content_floor + floor > budget:
+            break
+        header_total += headers[i]
+        content_floor += floor
+        packed += 1
+
+    needs = [count_tokens(content) for content in contents[:packed]]
+    if max_content_tokens:
+        needs = [min(need, max_content_tokens) for need in needs]
+    shares = _fair_shares(needs, budget - header_total)
+    if summarize is not None:
+        contents = summarize(contents[:packed], shares)
+    else:
+        contents = [truncate_to_tokens(content, share) for content, share in zip(contents, shares)]
+    result = ''
+    for i in range(packed):
+        result += NEWS_TEMPLATE.format(
+            n=i + 1,
+            keyword=articles[i].keyword,
+            title=articles[i].title,
+            content=contents[i],
+            url=articles[i].short_url
+        )
+    return PackResult(result, packed, len(articles) - packed, count_tokens(result))
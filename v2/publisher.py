@@ -0,0 +1,84 @@
+"""Posting a list of tweets as one reply-chained thread.
+
+Instead of sleeping a fixed second after every post, the publisher paces
+itself adaptively: the gap between posts grows when X answers with a rate
+limit (waiting for the advertised reset when there is one) and shrinks again
+after successes. Rate limits, server errors and connection failures are
+retried on the same link of the thread; errors that may have come after X
+got the request (read errors and timeouts) aren't, since the tweet may have
+been posted. A link that finally fails is skipped so the next tweet replies
+to the last tweet that was actually posted.
+"""
+import random
+import time
+from collections import namedtuple
+
+PostResult = namedtuple('PostResult', ['text', 'tweet_id', 'seconds', 'attempts', 'error'])
+
+# rate limits and server errors, and httpx errors raised before the request was sent
+_RETRYABLE = ('TooManyRequests', 'ServerError', 'ConnectError', 'ConnectTimeout', 'PoolTimeout')
+
+
+class ThreadPublisher:
+    def __init__(self, post, max_attempts: int = 4, min_interval: float = 0.5, max_delay: float = 300,
+                 on_unauthorized=None, reply_to=None):
+        self.post = post  # post(text, reply_to) -> posted tweet (with `.id`) or None
+        self.max_attempts = max_attempts
+        self.min_interval = min_interval
+        self.max_delay = max_delay
+        self.on_unauthorized = on_unauthorized  # called once to refresh the session on a 401
+        self.interval = min_interval
+        self.reply_to = reply_to  # id of the last posted tweet, the next post replies to it
+        self._last_post = 0.0
+
+    def _wait_turn(self):
+        delay = self._last_post + self.interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _retry_delay(self, error, attempt: int) -> float:
+        reset = getattr(error, 'rate_limit_reset', None)
+        if reset:
+            return min(self.max_delay, max(0, reset - time.time()) + 1)
+        return min(self.max_delay, 2 ** attempt + random.random())
+
+    def publish(self, tweets: list) -> list:
+        """Post `tweets` in order as a thread, continuing from `reply_to`, and return a PostResult per tweet."""
+        results = []
+        for text in tweets:
+            start = time.monotonic()
+            attempt, error, refreshed = 0, None, False
+            while attempt < self.max_attempts:
+                attempt += 1
+                self._wait_turn()
+                try:
+                    tweet = self.post(text, self.reply_to)
+                except Exception as e:
+                    self._last_post = time.monotonic()
+                    error = e
+                    name = type(e).__name__
+                    if name == 'Unauthorized' and self.on_unauthorized and not refreshed:
+                        refreshed = True
+                        self.on_unauthorized()
+                        continue
+                    if name not in _RETRYABLE:
+                        break
+                    if name == 'TooManyRequests':
+                        self.interval = min(self.max_delay, max(self.interval * 2, self.min_interval))
+                    delay = self._retry_delay(e, attempt)
+                    print(f"Post failed ({name}), retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    # the retry delay is this attempt's wait, _wait_turn doesn't add the interval on top
+                    self._last_post = time.monotonic() - self.interval
+                    continue
+                self._last_post = time.monotonic()
+                self.interval = max(self.min_interval, self.interval / 2)
+                tweet_id = getattr(tweet, 'id', None)
+                if tweet_id is not None:
+                    self.reply_to = tweet_id
+                error = None
+                results.append(PostResult(text, tweet_id, time.monotonic() - start, attempt, None))
+                break
+            if error is not None:
+                results.append(PostResult(text, None, time.monotonic() - start, attempt, error))
+        return results
@@ -0,0 +1,79 @@
+"""Persisted X (twikit) login sessions.
+
+Cookies from a successful login are saved to the cache directory and
+restored on the next start. A restored session is validated with a single
+account settings request, and the full login flow only runs when there is
+no saved session or it has expired.
+"""
+import json
+import os
+import time
+
+from metrics import metrics
+
+
+class XSession:
+    def __init__(self, path: str, username: str, email: str, password: str, language: str = 'en-US'):
+        self.path = path
+        self.username = username
+        self.email = email
+        self.password = password
+        self.language = language
+        self.metrics = {}  # how the last session was obtained and how long it took
+        self._client = None
+
+    def get_client(self):
+        """Return a logged-in twikit Client, reusing the saved session when it is still valid."""
+        if self._client is not None:
+            return self._client
+        from twikit import Client
+
+        start = time.monotonic()
+        if os.path.isfile(self.path):
+            client = Client(self.language)
+            try:
+                client.load_cookies(self.path)
+                self._validate(client)
+                self._client = client
+                self._record('cookies', time.monotonic() - start)
+                print(f"X session restored in {self.metrics['seconds']:.2f}s")
+                return client
+            except Exception as e:
+                metrics.inc('x_sessions_total', source='rejected')
+                print(f"Saved X session rejected, logging in again: {str(e)}")
+
+        client = Client(self.language)
+        client.login(
+            auth_info_1=self.username,
+            auth_info_2=self.email,
+            password=self.password
+        )
+        self._save(client)
+        self._client = client
+        self._record('login', time.monotonic() - start)
+        print(f"X client logged in in {self.metrics['seconds']:.2f}s")
+        return client
+
+    def _record(self, source: str, seconds: float):
+        self.metrics = {'source': source, 'seconds': seconds}
+        metrics.inc('x_sessions_total', source=source)
+        metrics.observe('x_session_seconds', seconds, source=source)
+
+    def invalidate(self):
+        """Forget the current session so the next `get_client` logs in again."""
+        self._client = None
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+    @staticmethod
+    def _validate(client):
+        # one request against the account settings endpoint; raises Unauthorized/Forbidden when expired
+        from twikit.utils import Endpoint
+
+        client.get(Endpoint.SETTINGS, headers=client._base_headers)
+
+    def _save(self, client):
+        # the cookies are credentials: write them readable by the owner only
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(client.get_cookies(), f)
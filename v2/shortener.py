@@ -0,0 +1,117 @@
+"""TinyURL shortening with a persistent cache.
+
+Successful short urls are cached on disk. Failures are stored separately
+with their timestamp, so a url that failed recently falls back to the long
+url immediately instead of waiting on the shortener again.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from metrics import metrics
+
+
+class ShortUrlService:
+    def __init__(self, path: str, timeout: float = 3, max_workers: int = 8, deadline: float = 15,
+                 failure_ttl: float = 3600, ttl_days: float = 30, http=None):
+        self.path = path
+        self.timeout = timeout
+        self.http = http  # shared HttpClient for the tinyurl requests, pyshorteners' own requests.get when None
+        self.max_workers = max_workers
+        self.deadline = deadline  # seconds to wait for a whole batch before falling back
+        self.failure_ttl = failure_ttl
+        self.ttl = ttl_days * 24 * 3600
+        self._shortener = None
+        self._lock = threading.Lock()
+        self._urls = {}  # url -> [short_url, ts]
+        self._failures = {}  # url -> ts of the last failure
+        if os.path.isfile(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self._urls = data.get('urls', {})
+            self._failures = data.get('failures', {})
+
+    def cached(self, url: str):
+        """Return the cached short url, the long url for a recent failure, or None on a miss."""
+        with self._lock:
+            if url in self._urls:
+                return self._urls[url][0]
+            if time.time() - self._failures.get(url, 0) < self.failure_ttl:
+                return url
+        return None
+
+    def _get_shortener(self):
+        # pyshorteners is only imported once there is a cache miss
+        with self._lock:
+            if self._shortener is None:
+                from pyshorteners.shorteners.tinyurl import Shortener
+
+                http = self.http
+
+                class PooledShortener(Shortener):
+                    def _get(self, url, params=None, headers=None):
+                        return http.get(self.clean_url(url), params=params, headers=headers, timeout=self.timeout,
+                                        verify=self.verify, proxies=self.proxies)
+
+                self._shortener = Shortener(timeout=self.timeout) if http is None else PooledShortener(timeout=self.timeout)
+            return self._shortener
+
+    def _shorten(self, url: str) -> str:
+        try:
+            with metrics.timer('shorten'):
+                short_url = self._get_shortener().short(url)
+        except Exception as e:
+            print(f"Error shortening url: {str(e)}")
+            metrics.inc('short_urls_total', result='failed')
+            with self._lock:
+                self._failures[url] = time.time()
+            return url
+        with self._lock:
+            self._urls[url] = [short_url, time.time()]
+            self._failures.pop(url, None)
+        metrics.inc('short_urls_total', result='shortened')
+        return short_url
+
+    def shorten(self, url: str) -> str:
+        short_url = self.cached(url)
+        if short_url is None:
+            short_url = self._shorten(url)
+            self.save()
+        return short_url
+
+    def shorten_many(self, urls: list) -> list:
+        """Shorten `urls` in order, shortening the cache misses concurrently.
+
+        Misses still pending after `deadline` seconds fall back to the long url;
+        their results are cached when they arrive.
+        """
+        results = [self.cached(url) for url in urls]
+        misses = list(dict.fromkeys(url for url, short_url in zip(urls, results) if short_url is None))
+        metrics.inc('short_urls_total', len(urls) - len(misses), result='cached')
+        if misses:
+            executor = ThreadPoolExecutor(max_workers=max(1, self.max_workers))
+            futures = {url: executor.submit(self._shorten, url) for url in misses}
+            done, not_done = wait(futures.values(), timeout=self.deadline)
+            executor.shutdown(wait=False, cancel_futures=True)
+            if not_done:
+                print(f"Shortener too slow, using long urls for {len(not_done)} articles")
+                metrics.inc('short_urls_total', len(not_done), result='timeout')
+            for i, url in enumerate(urls):
+                if results[i] is None:
+                    future = futures[url]
+                    results[i] = future.result() if future in done else url
+            self.save()
+        return results
+
+    def save(self):
+        with self._lock:
+            now = time.time()
+            self._urls = {url: entry for url, entry in self._urls.items() if now - entry[1] < self.ttl}
+            self._failures = {url: ts for url, ts in self._failures.items() if now - ts < self.failure_ttl}
+            data = {'urls': self._urls, 'failures': self._failures}
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=1)
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,113 @@
+"""Bounded queues and worker threads for the streaming news pipeline.
+
+Each stage runs on its own threads and hands items to the next stage through
+a `Channel`. A full channel blocks its producers, so a fast stage never runs
+far ahead of a slow one, and cancelling a channel releases every blocked
+producer and consumer once the other side has gone away.
+"""
+import queue
+import threading
+import time
+
+_CLOSED = object()
+
+
+class ChannelClosed(Exception):
+    pass
+
+
+class Channel:
+    def __init__(self, maxsize: int, producers: int = 1):
+        self._queue = queue.Queue(max(1, maxsize))
+        self._producers = producers
+        self._lock = threading.Lock()
+        self.cancelled = threading.Event()
+
+    def put(self, item) -> bool:
+        """Block until `item` is queued; return False if the channel was cancelled first."""
+        while not self.cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close(self):
+        # called once by every producer; the consumer sees the end after the last one
+        with self._lock:
+            self._producers -= 1
+            last = self._producers == 0
+        if last:
+            self.put(_CLOSED)
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def get(self, timeout: float = None):
+        """Return the next item, raise queue.Empty after `timeout`, or ChannelClosed at the end or once cancelled."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.cancelled.is_set():
+            wait = 0.1 if deadline is None else min(0.1, deadline - time.monotonic())
+            if wait <= 0:
+                raise queue.Empty
+            try:
+                item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                continue
+            if item is _CLOSED:
+                self._queue.put(_CLOSED)  # keep the end visible to other consumers
+                raise ChannelClosed
+            return item
+        raise ChannelClosed
+
+    def __iter__(self):
+        while True:
+            try:
+                yield self.get()
+            except ChannelClosed:
+                return
+
+
+def spawn(target, count: int, output: Channel, name: str) -> list:
+    """Start `count` daemon threads running `target()`, closing `output` as each one finishes."""
+    def run():
+        try:
+            target()
+        except Exception as e:
+            print(f"Error in {name} stage: {str(e)}")
+        finally:
+            output.close()
+
+    threads = [threading.Thread(target=run, name=f'{name}-{i}', daemon=True) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def batched(channel: Channel, size: int = None, max_wait: float = None):
+    """Yield lists of up to `size` items from `channel`.
+
+    A partial batch is yielded once `max_wait` seconds have passed since its
+    first item, so early items are not held back by a slow tail. With no size
+    or wait limit the whole stream is yielded as one batch.
+    """
+    batch, deadline = [], None
+    while True:
+        timeout = None if deadline is None else max(0, deadline - time.monotonic())
+        try:
+            item = channel.get(timeout=timeout)
+        except queue.Empty:
+            yield batch
+            batch, deadline = [], None
+            continue
+        except ChannelClosed:
+            break
+        batch.append(item)
+        if max_wait is not None and deadline is None:
+            deadline = time.monotonic() + max_wait
+        if size and len(batch) >= size:
+            yield batch
+            batch, deadline = [], None
+    if batch:
+        yield batch
@@ -0,0 +1,62 @@
+"""Writing a whole batch of tweets with a single structured completion.
+
+The model is asked, in JSON mode, for one object holding a tweet and its
+source link per news item. The reply is validated locally against that
+shape and the SOURCE links of the prompt, so a malformed reply or an
+invented link is caught before anything is posted, and the caller can fall
+back to the tweet writer agent.
+"""
+import json
+import re
+
+MAX_TWEET_LENGTH = 280
+
+_SOURCE_RE = re.compile(r'^NEWS \d+ SOURCE: (.*)$', re.MULTILINE)
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def news_sources(news_articles: str) -> list:
+    """Return the SOURCE links of a packed prompt, in order."""
+    return [source.strip() for source in _SOURCE_RE.findall(news_articles)]
+
+
+def tweet_messages(keyword: str, news_articles: str) -> list:
+    system_message = f"""You are an autonomous twitter bot that's created to educate the people about {keyword}.
+You are good at summarizing each news as one short tweet.
+You MUST only strictly include news that is about the topic {keyword} or the respective news topic given and ignore other news(double check this).
+Always use simple words.
+Reply with only a JSON object of the form {{"tweets": [{{"tweet": "...", "source": "..."}}]}}, one entry per tweet in the order of the news.
+Each "tweet" has at most {MAX_TWEET_LENGTH} characters and "source" is the exact SOURCE link of the news it summarizes."""
+    return [
+        {'role': 'system', 'content': system_message},
+        {'role': 'user', 'content': f"Write a twitter thread about the given list of news articles:\n{news_articles}"},
+    ]
+
+
+def parse_tweets(content: str, sources: list) -> tuple:
+    """Validate a model reply and return `(tweet_list, source_list)`.
+
+    Raises SchemaError when the reply is not a JSON object of that shape or a
+    source is not one of `sources`.
+    """
+    try:
+        data = json.loads(content or '')
+    except ValueError as e:
+        raise SchemaError(f"reply is not JSON: {str(e)}")
+    if not isinstance(data, dict) or not isinstance(data.get('tweets'), list):
+        raise SchemaError("reply has no 'tweets' list")
+    tweet_list, source_list = [], []
+    for i, item in enumerate(data['tweets']):
+        if not isinstance(item, dict) or not isinstance(item.get('tweet'), str) or not isinstance(item.get('source'), str):
+            raise SchemaError(f"tweet {i} is not an object with 'tweet' and 'source' strings")
+        tweet, source = item['tweet'].strip(), item['source'].strip()
+        if not tweet:
+            raise SchemaError(f"tweet {i} is empty")
+        if source not in sources:
+            raise SchemaError(f"tweet {i} has an unknown source {source!r}")
+        tweet_list.append(tweet)
+        source_list.append(source)
+    return tweet_list, source_list
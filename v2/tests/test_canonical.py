@@ -0,0 +1,78 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from canonical import canonical_link, canonicalize_url  # noqa: E402
+from ledger import UrlLedger  # noqa: E402
+
+
+@pytest.mark.parametrize('url, expected', [
+    # tracking parameters, as found in .cache/urls.csv
+    ('https://www.washingtonpost.com/business/2024/07/22/ai/444a083e_story.html?ref=upstract.com',
+     'https://www.washingtonpost.com/business/2024/07/22/ai/444a083e_story.html'),
+    ('https://www.forbes.com/sites/lanceeliot/2024/07/20/what-if/?ss=ai',
+     'https://www.forbes.com/sites/lanceeliot/2024/07/20/what-if'),
+    ('https://www.msn.com/en-us/money/markets/ar-BB1qnenH?ocid=finance-verthp-feeds',
+     'https://www.msn.com/en-us/money/markets/ar-BB1qnenH'),
+    ('https://example.com/a?utm_source=rss&utm_medium=rss&id=7', 'https://example.com/a?id=7'),
+    # scheme, host, port, fragment, trailing slash and parameter order
+    ('http://WWW.Example.com:80/a/b/?b=2&a=1#comments', 'https://www.example.com/a/b?a=1&b=2'),
+    ('https://example.com:8443/a', 'https://example.com:8443/a'),
+    ('https://example.com', 'https://example.com/'),
+    # mobile and AMP variants
+    ('https://m.jpost.com/business/article-1', 'https://www.jpost.com/business/article-1'),
+    ('https://www.example.com/news/amp/story-1/', 'https://www.example.com/news/story-1'),
+    ('https://www.example.com/news/story-1/amp', 'https://www.example.com/news/story-1'),
+    ('https://example-com.cdn.ampproject.org/c/s/example.com/news/story.amp.html?amp=1',
+     'https://example.com/news/story.html'),
+    # look-alikes that must stay as they are
+    ('https://www.example.com/ampere/x', 'https://www.example.com/ampere/x'),
+    ('https://m.com/x', 'https://m.com/x'),
+    ('https://www.webwire.com/ViewPressRel.asp?SESSIONID=&aId=324534',
+     'https://www.webwire.com/ViewPressRel.asp?SESSIONID=&aId=324534'),
+    ('https://marcelojose.com.br/?video=20240721qual%20o%20%C3%BAltimo.html',
+     'https://marcelojose.com.br/?video=20240721qual%20o%20%C3%BAltimo.html'),
+    # not a valid http(s) url: returned unchanged instead of raising
+    ('https://x.com:abc/a', 'https://x.com:abc/a'),
+    ('http://[::1/a', 'http://[::1/a'),
+    ('mailto:news@example.com', 'mailto:news@example.com'),
+])
+def test_canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+
+def test_canonicalize_url_is_idempotent():
+    url = canonicalize_url('http://m.example.com/news/amp/story/?utm_source=x&b=1')
+    assert canonicalize_url(url) == url
+
+
+def test_canonical_link():
+    html = '<html><head><link rel="canonical" href="https://www.x.com/a/?utm_medium=1&amp;id=3"></head><body>'
+    assert canonical_link(html) == 'https://www.x.com/a?id=3'
+    # a home page is no article's canonical url
+    assert canonical_link('<head><link rel=canonical href="https://www.x.com/"></head>') is None
+    assert canonical_link('<head></head><body><link rel="canonical" href="https://www.x.com/a"></body>') is None
+
+
+def test_ledger_rekey_merges_variants(tmp_path):
+    path = str(tmp_path / 'urls.csv')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('url,status,ts\n'
+                'https://example.com/a/?utm_source=rss,error,100\n'
+                'https://www.forbes.com/sites/x/?ss=ai,success,150\n'
+                'https://example.com/a,success,200\n')
+    ledger = UrlLedger(path)
+    assert ledger.rekey(canonicalize_url) == 2
+    assert ledger.history('https://example.com/a') == [('error', 100), ('success', 200)]
+    assert ledger.status('https://www.forbes.com/sites/x') == 'success'
+
+    reloaded = UrlLedger(path)
+    assert len(reloaded) == 2
+    assert reloaded.history('https://example.com/a') == [('error', 100), ('success', 200)]
+    # already canonical: nothing changes and the file is left alone
+    mtime = os.path.getmtime(path)
+    assert reloaded.rekey(canonicalize_url) == 0
+    assert os.path.getmtime(path) == mtime
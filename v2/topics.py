@@ -0,0 +1,84 @@
+"""Yield-weighted selection of the topics to query on a run.
+
+Every topic keeps decayed counts of its queries and of the new articles
+those queries produced, saved as JSON in the cache directory. A run gets a
+fixed query budget: most of it goes to the topics with the best smoothed
+yield, the rest to randomly chosen topics so that quiet topics are still
+checked now and then. A topic that keeps coming up empty is backed off for
+exponentially longer, up to `max_backoff_hours`, and is never dropped for
+good.
+"""
+import json
+import os
+import random
+import threading
+import time
+
+
+class TopicScheduler:
+    def __init__(self, path: str, budget: int = 30, exploration: float = 0.2, decay: float = 0.9,
+                 backoff_hours: float = 1, max_backoff_hours: float = 24, prior_articles: float = 1,
+                 prior_queries: float = 1):
+        self.path = path
+        self.budget = budget  # topics queried per run, 0 for all of them
+        self.exploration = exploration  # share of the budget picked at random
+        self.decay = decay  # weight of the history kept on every new query of a topic
+        self.backoff = backoff_hours * 3600
+        self.max_backoff = max_backoff_hours * 3600
+        self.prior_articles = prior_articles  # new topics start with an optimistic yield of prior_articles/prior_queries
+        self.prior_queries = prior_queries
+        self._lock = threading.Lock()
+        self._stats = {}  # topic -> {'queries', 'articles', 'empty_streak', 'skip_until', 'last_query'}
+        self._pending = {}  # topic -> new articles found by the current run's query
+        if os.path.isfile(path):
+            with open(path, encoding='utf-8') as f:
+                self._stats = json.load(f)
+
+    def expected_yield(self, topic: str) -> float:
+        stats = self._stats.get(topic, {})
+        return (stats.get('articles', 0) + self.prior_articles) / (stats.get('queries', 0) + self.prior_queries)
+
+    def select(self, topics: list, now: float = None) -> list:
+        """Return up to `budget` of `topics` to query, the most productive first."""
+        now = time.time() if now is None else now
+        eligible = [topic for topic in dict.fromkeys(topics) if self._stats.get(topic, {}).get('skip_until', 0) <= now]
+        budget = len(eligible) if self.budget <= 0 else min(self.budget, len(eligible))
+        # random tie-break, so topics with the same yield (like all new ones) take turns
+        ranked = sorted(eligible, key=lambda topic: (-self.expected_yield(topic), random.random()))
+        exploit = ranked[:budget - int(budget * self.exploration)]
+        explore = random.sample(ranked[len(exploit):], budget - len(exploit))
+        skipped = len(topics) - len(eligible)
+        print(f"Topics: querying {len(exploit)} by yield and {len(explore)} at random, {skipped} backed off")
+        return exploit + explore
+
+    def queried(self, topic: str):
+        with self._lock:
+            self._pending.setdefault(topic, 0)
+
+    def credit(self, topic: str, articles: int = 1):
+        """Count new articles found for a topic queried in this run."""
+        with self._lock:
+            if topic in self._pending:
+                self._pending[topic] += articles
+
+    def commit(self, now: float = None):
+        """Fold the results of this run's queries into the history and save it."""
+        now = time.time() if now is None else now
+        with self._lock:
+            for topic, articles in self._pending.items():
+                stats = self._stats.setdefault(topic, {'queries': 0, 'articles': 0, 'empty_streak': 0, 'skip_until': 0})
+                stats['queries'] = round(stats['queries'] * self.decay + 1, 4)
+                stats['articles'] = round(stats['articles'] * self.decay + articles, 4)
+                stats['last_query'] = now
+                if articles:
+                    stats['empty_streak'], stats['skip_until'] = 0, 0
+                else:
+                    stats['empty_streak'] += 1
+                    # the first empty query is free, then back off 1, 2, 4... hours
+                    if stats['empty_streak'] > 1:
+                        stats['skip_until'] = now + min(self.max_backoff, self.backoff * 2 ** (stats['empty_streak'] - 2))
+            self._pending = {}
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._stats, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)